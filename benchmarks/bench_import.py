@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Measures how long importing nalibali_chef takes, and checks it against a startup budget.
+
+    ./benchmarks/bench_import.py --runs=10 --budget-ms=10
+
+Every import is timed in a fresh interpreter. ricecooker.chefs, which NalibaliChef
+subclasses, loads most of ricecooker and is paid by every run of the chef, so the budget
+applies to what the chef adds on top of it: the import time of nalibali_chef once
+ricecooker.chefs is loaded, as reported by python -X importtime. The modules the chef
+loads itself are listed by cumulative import time. Exits with status 1 when the median
+goes over the budget.
+"""
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHEF_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_MODULE = 'ricecooker.chefs'
+CHEF_MODULE = 'nalibali_chef'
+
+
+def run_python(args):
+    return subprocess.run([sys.executable, *args], cwd=CHEF_DIR, check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE).stderr.decode()
+
+
+def wall_time(statement):
+    start = time.perf_counter()
+    run_python(['-c', statement])
+    return time.perf_counter() - start
+
+
+def chef_imports():
+    """Returns the cumulative import time in microseconds of the modules the chef loads itself"""
+    stderr = run_python(['-X', 'importtime', '-c',
+        f'import {BASELINE_MODULE}, sys; print("--", file=sys.stderr); import {CHEF_MODULE}'])
+    imports = {}
+    for line in stderr.split('\n--\n', 1)[-1].splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            imports[module.strip()] = int(cumulative)
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Number of fresh interpreters each import is timed in')
+    parser.add_argument('--budget-ms', type=float, default=10,
+        help=f'Maximum median time {CHEF_MODULE} may add to the import of {BASELINE_MODULE}')
+    parser.add_argument('--top', type=int, default=10, help='Number of the slowest modules loaded by the chef to list')
+    args = parser.parse_args()
+
+    # The bytecode of the chef is written by its first import, unless PYTHONDONTWRITEBYTECODE
+    # is set, and compiling it again on every run is not what the chef's startup costs
+    compileall.compile_file(os.path.join(CHEF_DIR, f'{CHEF_MODULE}.py'), quiet=1)
+    interpreter, baseline, chef, own = [], [], [], []
+    for _ in range(args.runs):
+        interpreter.append(wall_time('pass'))
+        baseline.append(wall_time(f'import {BASELINE_MODULE}'))
+        chef.append(wall_time(f'import {CHEF_MODULE}'))
+        imports = chef_imports()
+        own.append(imports[CHEF_MODULE] / 1e6)
+
+    print(f"{'import':<40} {'median ms':>10} {'max ms':>10}")
+    for name, times in (('interpreter startup', interpreter), (BASELINE_MODULE, baseline), (CHEF_MODULE, chef),
+            (f'{CHEF_MODULE} after {BASELINE_MODULE}', own)):
+        print(f'{name:<40} {statistics.median(times) * 1000:>10.1f} {max(times) * 1000:>10.1f}')
+
+    print(f'\nslowest modules loaded by {CHEF_MODULE} itself (last run, cumulative ms)')
+    for module, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {module:<50} {cumulative / 1000:>8.1f}')
+
+    own_ms = statistics.median(own) * 1000
+    within_budget = own_ms <= args.budget_ms
+    print(f"\n{CHEF_MODULE} adds {own_ms:.1f} ms to startup, budget {args.budget_ms:.1f} ms: {'ok' if within_budget else 'OVER BUDGET'}")
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == '__main__':
+    main()
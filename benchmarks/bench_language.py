@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Compares the cost of resolving the language of a node with le_utils' lookups and with
+the LanguageTable of the chef.
+
+    ./benchmarks/bench_language.py --iterations=10000 Sesotho isiXhosa sotho Klingon
+
+Every story and audio node resolves the language it was crawled under. le_utils
+compares the name with every language name, and then with every native name when it
+is not one, which the chef used to do for every node. The LanguageTable indexes the
+names once, which is timed separately, and resolves each name once.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from le_utils.constants.languages import getlang_by_name, getlang_by_native_name
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nalibali_chef import LanguageTable
+
+# Spellings found on the site: English names, native names, aliases and a name le_utils does not know
+NAMES = ['English', 'Afrikaans', 'isiXhosa', 'isiZulu', 'Sesotho', 'Setswana', 'Tshivenda', 'sotho', 'tsw', 'Klingon']
+
+
+def le_utils_code(name):
+    language = getlang_by_name(name) or getlang_by_native_name(name)
+    return language.code if language else None
+
+
+def per_call(func, name, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(name)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', default=NAMES, help='Language names to resolve')
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench_language')
+    logger.disabled = True
+    start = time.perf_counter()
+    LanguageTable._build_indexes()
+    print(f'LanguageTable index built in {(time.perf_counter() - start) * 1000:.2f} ms\n')
+
+    table = LanguageTable(logger)
+    print(f"{'name':<20} {'le_utils':>8} {'table':>8} {'le_utils us':>12} {'table us':>10} {'speedup':>8}")
+    for name in args.names:
+        # Aliases used to be mapped by the crawl before le_utils was asked
+        le_utils_name = table.name(name)
+        le_utils_time = per_call(le_utils_code, le_utils_name, args.iterations)
+        table_time = per_call(table.code, name, args.iterations)
+        print(f'{name[:20]:<20} {le_utils_code(le_utils_name) or "-":>8} {table.code(name):>8} '
+            f'{le_utils_time * 1e6:>12.2f} {table_time * 1e6:>10.3f} {le_utils_time / table_time:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Compares parse time and memory of full and SoupStrainer-limited parsing of pages.
+
+    ./benchmarks/bench_parsing.py http://nalibali.org/story-library/multilingual-stories http://nalibali.org/node/2021
+
+Each page is parsed with every parser backend, once building the full tree and once
+with every parse filter NalibaliChef uses.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nalibali_chef import NalibaliChef, declared_encoding
+
+PARSERS = ['html.parser', 'lxml']
+PARSE_FILTERS = [
+    'REGION_CONTENT_ONLY',
+    'PAGINATION_ONLY',
+    'VIEW_CONTENT_ONLY',
+    'SECTION_MAIN_ONLY',
+]
+
+
+def read_page(location, from_encoding):
+    if os.path.exists(location):
+        with open(location, 'rb') as f:
+            return f.read(), from_encoding
+    response = requests.get(location)
+    return response.content, declared_encoding(response) or from_encoding
+
+
+def measure(content, encoding, parser, parse_only, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        BeautifulSoup(content, parser, parse_only=parse_only, from_encoding=encoding)
+    elapsed = (time.perf_counter() - start) / iterations
+    tracemalloc.start()
+    soup = BeautifulSoup(content, parser, parse_only=parse_only, from_encoding=encoding)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del soup
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='+', help='URLs or local HTML files')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--from-encoding', default=None,
+        help='Encoding of local files and of pages served without a charset, detected when not given')
+    args = parser.parse_args()
+
+    print(f"{'page':<60} {'parser':<12} {'filter':<20} {'ms/parse':>10} {'peak KiB':>10}")
+    for location in args.pages:
+        content, encoding = read_page(location, args.from_encoding)
+        for parser_name in PARSERS:
+            filters = [('full tree', None)] + [(name, getattr(NalibaliChef, name)) for name in PARSE_FILTERS]
+            for filter_name, parse_only in filters:
+                elapsed, peak = measure(content, encoding, parser_name, parse_only, args.iterations)
+                print(f'{location[-60:]:<60} {parser_name:<12} {filter_name:<20} {elapsed * 1000:>10.2f} {peak / 1024:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Benchmarks the crawl and scrape stages of NalibaliChef against a locally served fixture site.
+
+    ./benchmarks/bench_stages.py --stories=100 --output=bench_results.json -- --crawl-workers=4
+
+Arguments after -- are passed to the chef. Each stage runs in its own process in a fresh
+working directory, and reports wall time, throughput and peak RSS for every hierarchy it
+goes through: the paginated hierarchies and the audio RSS feeds during the crawl, the HTML5
+stories, audio stories and PDF story cards during the scrape. Results are appended to the
+--output JSON file so that runs can be compared over time.
+
+The peak RSS of a hierarchy is sampled in the stage process while the hierarchy runs, so it
+leaves out --scrape-workers processes. The stage itself reports the peak RSS of its process
+and of its children.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixture_site import FixtureSite
+
+STAGES = ['crawl', 'scrape']
+PHASE_TIMERS = ('crawl.hierarchy.', 'scrape.hierarchy.')
+# Seconds the parent waits for results before checking that the stage process is alive
+RESULTS_POLL_INTERVAL = 1
+
+
+def current_rss_kib():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        # Without /proc, the peak of the process so far is the closest estimate
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RssSampler(threading.Thread):
+    """
+    Samples the RSS of the process and keeps the peak of every phase running while it is sampled.
+    """
+    INTERVAL = 0.01
+
+    def __init__(self):
+        super().__init__(name='rss-sampler', daemon=True)
+        self._lock = threading.Lock()
+        self._active = {}
+        self._peaks = {}
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(RssSampler.INTERVAL):
+            self.sample()
+
+    def stop(self):
+        self._stopped.set()
+
+    def sample(self):
+        rss = current_rss_kib()
+        with self._lock:
+            for name in self._active:
+                self._peaks[name] = max(self._peaks.get(name, 0), rss)
+
+    @contextmanager
+    def track(self, name):
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+        self.sample()
+        try:
+            yield
+        finally:
+            self.sample()
+            with self._lock:
+                self._active[name] -= 1
+                if not self._active[name]:
+                    del self._active[name]
+
+    def peak(self, name):
+        with self._lock:
+            return self._peaks.get(name)
+
+
+def track_phases(sampler):
+    """Samples RSS inside the timers the chef puts around each hierarchy"""
+    from nalibali_chef import METRICS
+    timer = METRICS.timer
+
+    @contextmanager
+    def tracked_timer(name):
+        if not name.startswith(PHASE_TIMERS):
+            with timer(name):
+                yield
+            return
+        with sampler.track(name), timer(name):
+            yield
+
+    METRICS.timer = tracked_timer
+
+
+def stage_peak_rss_kib():
+    return dict(
+        peak_rss_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        children_peak_rss_kib=resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def count_leaves(node):
+    children = node.get('children')
+    if not children:
+        return 1
+    return sum(count_leaves(child) for child in children)
+
+
+def hierarchy_wall_time(name):
+    from nalibali_chef import METRICS
+    latency = METRICS.snapshot()['latencies'].get(name)
+    return latency['total'] if latency else 0
+
+
+def phase(name, elapsed, stories, **rss):
+    return dict(
+        phase=name,
+        wall_time_s=round(elapsed, 4),
+        stories=stories,
+        stories_per_s=round(stories / elapsed, 2) if elapsed else None,
+        **rss,
+    )
+
+
+def run_stage(stage, host, workdir, chef_args, results):
+    from nalibali_chef import NalibaliChef, Html, create_http_session, create_logger
+
+    os.chdir(workdir)
+    NalibaliChef.HOSTNAME = host
+    NalibaliChef.ROOT_URL = f'http://{host}/story-library'
+    logger = create_logger()
+    logger.setLevel('WARNING')
+    chef = NalibaliChef(Html(create_http_session(NalibaliChef.HOSTNAME), logger), logger)
+    args = vars(chef.arg_parser.parse_args(chef_args))
+    phases = []
+    sampler = RssSampler()
+    track_phases(sampler)
+    sampler.start()
+
+    # Both stages stream their output to disk, so the phases are timed by the chef's own
+    # metrics and their stories are counted in the output files
+    start = time.perf_counter()
+    json_tree_path = chef.crawl(args, {}) if stage == 'crawl' else chef.scrape(args, {})
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    if stage == 'crawl':
+        with open(json_tree_path) as json_file:
+            hierarchies = json.load(json_file)['children']
+        for h in hierarchies:
+            kind = 'audio_rss' if NalibaliChef.AUDIO_STORIES_RE.search(h['title']) else 'pagination'
+            stories = sum(len(s) for s in h['children'].values())
+            timer_name = f"crawl.hierarchy.{h['title']}"
+            phases.append(phase(f"crawl/{kind}/{h['title']}", hierarchy_wall_time(timer_name), stories,
+                peak_rss_kib=sampler.peak(timer_name)))
+        stories = sum(len(s) for h in hierarchies for s in h['children'].values())
+    else:
+        with open(json_tree_path) as json_file:
+            topics = json.load(json_file)['children']
+        for topic in topics:
+            kind = NalibaliChef.SCRAPING_FUNCS[topic['title']].replace('_scrape_', '')
+            timer_name = f"scrape.hierarchy.{topic['title']}"
+            phases.append(phase(f"scrape/{kind}/{topic['title']}", hierarchy_wall_time(timer_name), count_leaves(topic),
+                peak_rss_kib=sampler.peak(timer_name)))
+        stories = sum(count_leaves(topic) for topic in topics)
+    phases.append(phase(stage, elapsed, stories, **stage_peak_rss_kib()))
+    results.put(phases)
+
+
+def wait_for_phases(stage, process, results):
+    while True:
+        try:
+            return results.get(timeout=RESULTS_POLL_INTERVAL)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # The results are flushed before the process exits, so they are there if it succeeded
+        try:
+            return results.get(timeout=RESULTS_POLL_INTERVAL)
+        except queue.Empty:
+            raise SystemExit(f'The {stage} stage exited with code {process.exitcode} without results')
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stories', type=int, default=40, help='Stories per paginated hierarchy')
+    parser.add_argument('--images', type=int, default=3, help='Images per HTML5 story')
+    parser.add_argument('--episodes', type=int, default=20, help='Audio episodes per language')
+    parser.add_argument('--image-size', type=int, default=20000, help='Size in bytes of every image')
+    parser.add_argument('--real-images', action='store_true', help='Serve full-size JPEG and PNG images instead of filler bytes')
+    parser.add_argument('--aliases', action='store_true', help='Link some stories in two languages to the same story page')
+    parser.add_argument('--max-requests-per-second', type=int, help='Answer requests past this rate with 429 and Retry-After')
+    parser.add_argument('--workdir', help='Working directory to run the chef in, a temporary one by default. '
+        'Reusing it keeps the HTTP cache and chefdata of previous runs.')
+    parser.add_argument('--output', help='JSON file the results are appended to')
+    parser.add_argument('chef_args', nargs=argparse.REMAINDER, help='Arguments passed to the chef, after --')
+    args = parser.parse_args()
+    chef_args = [a for a in args.chef_args if a != '--']
+
+    site = FixtureSite(
+        stories_per_hierarchy=args.stories,
+        images_per_story=args.images,
+        episodes_per_language=args.episodes,
+        image_size=args.image_size,
+        real_images=args.real_images,
+        aliases=args.aliases,
+        max_requests_per_second=args.max_requests_per_second,
+    )
+    server = site.serve()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='nalibali-bench-')
+    for data_dir in ('trees', 'zipfiles'):
+        os.makedirs(os.path.join(workdir, 'chefdata', data_dir), exist_ok=True)
+
+    phases = []
+    context = multiprocessing.get_context('fork')
+    for stage in STAGES:
+        results = context.Queue()
+        process = context.Process(target=run_stage, args=(stage, site.host, workdir, chef_args, results))
+        process.start()
+        try:
+            stage_phases = wait_for_phases(stage, process, results)
+        except SystemExit:
+            server.shutdown()
+            raise
+        process.join()
+        phases.extend(stage_phases)
+    server.shutdown()
+
+    print(f"{'phase':<45} {'wall s':>9} {'stories':>8} {'stories/s':>10} {'peak RSS KiB':>13}")
+    for p in phases:
+        print(f"{p['phase']:<45} {p['wall_time_s']:>9.3f} {p['stories']:>8} {p['stories_per_s'] or 0:>10.1f} {p['peak_rss_kib'] or 0:>13}")
+
+    if args.output:
+        run = dict(
+            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            git_revision=git_revision(),
+            fixture=dict(stories=args.stories, images=args.images, episodes=args.episodes, image_size=args.image_size,
+                real_images=args.real_images),
+            chef_args=chef_args,
+            phases=phases,
+        )
+        runs = []
+        if os.path.exists(args.output):
+            with open(args.output) as json_file:
+                runs = json.load(json_file)
+        runs.append(run)
+        with open(args.output, 'w') as json_file:
+            json.dump(runs, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
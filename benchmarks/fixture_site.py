@@ -0,0 +1,273 @@
+"""
+Synthetic, locally served copy of the parts of nalibali.org and iono.fm the chef reads.
+
+The generated pages follow the markup of the live site closely enough for
+NalibaliChef to crawl and scrape them: the story library index, paginated
+hierarchy listings, localized story pages with images, PDF story cards and the
+iono.fm audio pages with their RSS feeds.
+"""
+import hashlib
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LANGUAGES = ['English', 'isiXhosa', 'isiZulu', 'Afrikaans', 'Sesotho']
+HIERARCHIES = [
+    ('Multilingual stories', 'multilingual-stories', 'html5'),
+    ('Audio stories', 'audio-stories', 'audio'),
+    ('Story cards', 'story-cards', 'pdf'),
+    ('Story seeds', 'story-seeds', 'html5'),
+    ('Your stories', 'your-stories', 'html5'),
+]
+STORIES_PER_PAGE = 10
+PAGINATION_WINDOW = 5
+
+
+class FixtureSite:
+    def __init__(self, stories_per_hierarchy=40, images_per_story=3, episodes_per_language=20, image_size=20000, real_images=False,
+            aliases=False, max_requests_per_second=None):
+        """
+        Images are image_size bytes of filler, or full-size photo-like JPEG and PNG
+        images when real_images is set, which needs Pillow. With aliases, the last
+        language of every fifth story links to an aliased path of its first language.
+        Requests past max_requests_per_second are answered with 429 and Retry-After.
+        """
+        self.stories_per_hierarchy = stories_per_hierarchy
+        self.images_per_story = images_per_story
+        self.episodes_per_language = episodes_per_language
+        self.image_size = image_size
+        self.real_images = real_images
+        self.aliases = aliases
+        self.max_requests_per_second = max_requests_per_second
+        self.throttled = 0
+        self._window = (0, 0)
+        self._window_lock = threading.Lock()
+        self._images = {}
+        self.host = None
+
+    #region Pages
+    def root_page(self):
+        rows = ''.join(
+            f'<div class="views-row"><h2>{title}</h2>'
+            f'<img class="img-responsive" src="http://{self.host}/sites/default/files/images/{slug}.jpg">'
+            f'<div class="body">All about {title.lower()}.</div>'
+            f'<div class="views-field"><a class="btn link" href="/story-library/{slug}">Read more</a></div></div>'
+            for title, slug, _ in HIERARCHIES
+        )
+        return self._html(f'<div class="region-content"><div class="view-vocabulary">{rows}</div></div>')
+
+    def hierarchy_page(self, slug, page):
+        kind = next(k for _, s, k in HIERARCHIES if s == slug)
+        if kind == 'audio':
+            return self.audio_hierarchy_page(slug)
+        pages = max(1, -(-self.stories_per_hierarchy // STORIES_PER_PAGE))
+        first = page * STORIES_PER_PAGE
+        # Newest stories are listed first
+        indices = range(first, min(first + STORIES_PER_PAGE, self.stories_per_hierarchy))
+        rows = ''.join(self.story_row(slug, kind, self.stories_per_hierarchy - 1 - i) for i in indices)
+        return self._html(f'<div class="region-content"><div class="view-content">{rows}</div>{self.pagination(slug, page, pages, kind)}</div>')
+
+    def story_row(self, slug, kind, index):
+        links = []
+        for lang_index, language in enumerate(LANGUAGES):
+            node = self.node_id(slug, index, lang_index)
+            href = f'/sites/default/files/cards/{node}.pdf' if kind == 'pdf' else f'/node/{node}'
+            if self.aliases and kind == 'html5' and index % 5 == 0 and lang_index == len(LANGUAGES) - 1:
+                href = f'/content/story-{self.node_id(slug, index, 0)}'
+            links.append(f'<a href="{href}">{language}</a>')
+        return (
+            f'<div class="views-row"><span property="dc:title" content="{slug} story {index}"></span>'
+            f'<div class="field-date">Posted on July {index % 28 + 1}th, 2017</div>'
+            f'<div class="field-author">Author: Writer {index}</div>'
+            f'<div class="field-body">Description of story {index}.</div>'
+            f'<img class="img-responsive" src="/sites/default/files/styles/story_thumb/{slug}_{index}.jpg?itok=x">'
+            f'<div class="links">{"".join(links)}</div></div>'
+        )
+
+    def pagination(self, slug, page, pages, kind):
+        if pages <= 1:
+            return ''
+        base = f'/story-library/{slug}'
+        start = max(0, min(page - PAGINATION_WINDOW // 2, pages - PAGINATION_WINDOW))
+        items = [f'<li><a href="{base}?page={p}">{p + 1}</a></li>' for p in range(start, min(pages, start + PAGINATION_WINDOW))]
+        if page + 1 < pages:
+            items.append(f'<li><a href="{base}?page={page + 1}">next ›</a></li>')
+            # Story cards do not have a <<last>> pagination item on the live site
+            if kind != 'pdf':
+                items.append(f'<li><a href="{base}?page={pages - 1}">last »</a></li>')
+        return f'<ul class="pagination">{"".join(items)}</ul>'
+
+    def story_page(self, node):
+        images = ''.join(f'<p><img src="/sites/default/files/stories/{node}_{i}.jpg" alt=""></p>' for i in range(self.images_per_story))
+        images += '<p><img src="/sites/default/files/chrome/logo.png" alt=""></p>'
+        return self._html(
+            '<section id="section-main">'
+            f'<h1 class="page-header">Story {node}</h1>'
+            '<div class="languages-links"><a href="/node/1">English</a></div>'
+            f'<div class="field-body"><p>{"Once upon a time. " * 50}</p>{images}</div>'
+            '</section>',
+            links=f'<link rel="canonical" href="/node/{node}"><link rel="shortlink" href="/node/{node}">',
+        )
+
+    def audio_hierarchy_page(self, slug):
+        anchors = ''.join(f'<p><a href="/story-library/{slug}/{language.lower()}">{language}</a></p>' for language in LANGUAGES)
+        return self._html(f'<section id="section-main"><div class="region-content">{anchors}</div></section>')
+
+    def audio_language_page(self, language):
+        return self._html(f'<p><a href="http://{self.host}/iono.fm/c/{language}">Listen on iono.fm</a></p>')
+
+    def iono_page(self, language):
+        return self._html(f'<link rel="alternate" type="application/rss+xml" href="http://{self.host}/iono.fm/rss/chan/{language}">', head=True)
+
+    def rss_feed(self, language):
+        items = ''.join(
+            '<item>'
+            f'<title>{language} episode {i}</title>'
+            f'<enclosure url="http://{self.host}/audio/{language}/episode_{i}.m4a?source=rss" type="audio/x-m4a" length="1000"/>'
+            f'<itunes:summary>Episode {i} in {language}</itunes:summary>'
+            f'<pubDate>Mon, 0{i % 9 + 1} Jan 2018 10:00:00 +0000</pubDate>'
+            '<itunes:author>Nal\'ibali</itunes:author>'
+            f'<media:thumbnail href="http://{self.host}/audio/{language}/episode_{i}.jpg"/>'
+            '</item>'
+            for i in range(self.episodes_per_language)
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd" xmlns:media="http://search.yahoo.com/mrss/">'
+            f'<channel><title>{language}</title>{items}</channel></rss>'
+        ).encode('utf-8')
+
+    def binary(self, path, size):
+        seed = hashlib.sha256(path.encode('utf-8')).digest()
+        return (seed * (size // len(seed) + 1))[:size]
+
+    def image(self, path):
+        if not self.real_images:
+            return self.binary(path, self.image_size)
+        if path not in self._images:
+            from PIL import Image
+            size = (1600, 1200)
+            seed = hashlib.sha256(path.encode('utf-8')).digest()
+            image = Image.merge('RGB', [
+                Image.effect_noise(size, 20 + seed[0] % 40),
+                Image.linear_gradient('L').rotate(seed[1] % 360).resize(size),
+                Image.radial_gradient('L').resize(size),
+            ])
+            output = io.BytesIO()
+            image.save(output, 'PNG' if path.endswith('.png') else 'JPEG', quality=95)
+            self._images[path] = output.getvalue()
+        return self._images[path]
+
+    def node_id(self, slug, index, lang_index):
+        slug_index = next(i for i, (_, s, _) in enumerate(HIERARCHIES) if s == slug)
+        return (slug_index + 1) * 100000 + index * 10 + lang_index
+
+    def _html(self, content, head=False, links=''):
+        if head:
+            return f'<!DOCTYPE html><html><head>{content}</head><body></body></html>'.encode('utf-8')
+        return f'<!DOCTYPE html><html><head><title>Nal\'ibali</title>{links}</head><body>{content}</body></html>'.encode('utf-8')
+    #endregion Pages
+
+    def route(self, path, query):
+        parts = [p for p in path.split('/') if p]
+        if path == '/story-library':
+            return 'text/html; charset=utf-8', self.root_page()
+        if len(parts) == 2 and parts[0] == 'story-library':
+            return 'text/html; charset=utf-8', self.hierarchy_page(parts[1], int(query.get('page', ['0'])[0]))
+        if len(parts) == 3 and parts[0] == 'story-library':
+            return 'text/html; charset=utf-8', self.audio_language_page(parts[2])
+        if len(parts) == 2 and parts[0] == 'node':
+            return 'text/html; charset=utf-8', self.story_page(parts[1])
+        if len(parts) == 2 and parts[0] == 'content' and parts[1].startswith('story-'):
+            return 'text/html; charset=utf-8', self.story_page(parts[1][len('story-'):])
+        if parts[:2] == ['iono.fm', 'c']:
+            return 'text/html; charset=utf-8', self.iono_page(parts[2])
+        if parts[:3] == ['iono.fm', 'rss', 'chan']:
+            return 'application/rss+xml', self.rss_feed(parts[3])
+        if path.endswith('.pdf'):
+            return 'application/pdf', self.binary(path, 50000)
+        if path.endswith('.mp3'):
+            return 'audio/mpeg', self.binary(path, 100000)
+        if path.endswith(('.jpg', '.png')):
+            return 'image/png' if path.endswith('.png') else 'image/jpeg', self.image(path)
+        return None, None
+
+    def throttle(self):
+        """Counts a request, and returns True when it goes past max_requests_per_second"""
+        if not self.max_requests_per_second:
+            return False
+        with self._window_lock:
+            second, count = self._window
+            now = int(time.time())
+            count = count + 1 if now == second else 1
+            self._window = (now, count)
+            if count > self.max_requests_per_second:
+                self.throttled += 1
+                return True
+            return False
+
+    def serve(self, port=0):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, which stalls keep-alive connections on
+            # delayed ACKs unless Nagle's algorithm is disabled
+            disable_nagle_algorithm = True
+
+            def _respond(self, with_body):
+                if site.throttle():
+                    self.send_response(429)
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                parsed = urlparse(self.path)
+                content_type, body = site.route(parsed.path, parse_qs(parsed.query))
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                # Only the open-ended byte ranges used to resume downloads are supported
+                range_header = self.headers.get('Range', '')
+                if range_header.startswith('bytes=') and range_header.endswith('-') and self.headers.get('If-Range', etag) == etag:
+                    start = int(range_header[len('bytes='):-1])
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{len(body)}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+                    body = body[start:]
+                else:
+                    self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        server.daemon_threads = True
+        self.host = '127.0.0.1:{}'.format(server.server_address[1])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
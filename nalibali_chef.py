@@ -1,28 +1,46 @@
 #!/usr/bin/env python
 
 import os
+import io
 import logging
 import requests
 import json
+import sqlite3
+import zlib
+import zipfile
+import signal
+import functools
+import hashlib
+import base64
+import time
+import random
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from itertools import repeat
 from re import I as IgnoreCase
 from re import compile
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import tempfile
 import shutil
 import pathlib
 from urllib.parse import urlparse
 from pathlib import PurePosixPath
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from cachecontrol.cache import BaseCache
 
 from le_utils.constants import content_kinds, licenses
-from le_utils.constants.languages import getlang_by_native_name, getlang_by_name
+from le_utils.constants.languages import LANGUAGELIST
 from ricecooker.chefs import JsonTreeChef
 from ricecooker.classes.licenses import get_license
-from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter, InvalidatingCacheControlAdapter
-from ricecooker.utils.html import download_file
-from ricecooker.utils.jsontrees import write_tree_to_json_tree
-from ricecooker.utils.zip import create_predictable_zip
-from ricecooker.classes.nodes import HTML5AppNode, AudioNode
-from ricecooker.classes import files
+from ricecooker.utils.caching import CacheForeverHeuristic, FileCache, CacheControlAdapter
 
 def create_logger():
     logging.getLogger("cachecontrol.controller").setLevel(logging.WARNING)
@@ -31,38 +49,1557 @@ def create_logger():
     LOGGER.setLevel(logging.DEBUG)
     return LOGGER
 
-def create_http_session(hostname):
+def create_http_session(hostname, archive_path=None, archive_mode=None, cache=None, pool_maxsize=None):
+    """
+    archive_mode 'record' stores every response of the session in the HTTP archive at
+    archive_path, 'replay' serves every request from that archive without network access.
+    cache defaults to the FileCache in .webcache. pool_maxsize is the number of connections
+    kept open to each host, which should be at least the number of concurrent requests.
+    """
     sess = requests.Session()
-    cache = FileCache('.webcache')
-    basic_adapter = CacheControlAdapter(cache=cache)
-    forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache)
+    if archive_mode == 'replay':
+        replay_adapter = ReplayAdapter(HttpArchive(archive_path))
+        sess.mount('http://', replay_adapter)
+        sess.mount('https://', replay_adapter)
+        return sess
+    if cache is None:
+        cache = FileCache('.webcache')
+    pool_maxsize = pool_maxsize or requests.adapters.DEFAULT_POOLSIZE
+    basic_adapter = CacheControlAdapter(cache=cache, pool_maxsize=pool_maxsize)
+    forever_adapter = CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=cache, pool_maxsize=pool_maxsize)
     sess.mount('http://', basic_adapter)
     sess.mount('https://', basic_adapter)
     sess.mount('http://www.' + hostname, forever_adapter)
     sess.mount('https://www.' + hostname, forever_adapter)
+    if archive_mode == 'record':
+        archive = HttpArchive(archive_path)
+        for prefix, adapter in list(sess.adapters.items()):
+            sess.mount(prefix, RecordingAdapter(adapter, archive))
     return sess
 
+# mkstemp creates files readable by their owner only, so the files it replaces are
+# given the permissions open() gives new files instead
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+@contextmanager
+def atomic_write(path, mode='w', encoding=None, suffix=''):
+    """
+    Opens a temporary file next to path, moved in place once written, so that an
+    interrupted run does not leave a partial file behind. The file keeps the
+    permissions of the one it replaces.
+    """
+    directory = os.path.dirname(path) or '.'
+    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+        try:
+            file_mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            file_mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, file_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+#region Streaming JSON
+class StreamedList:
+    """A JSON array whose items are produced by an iterable while it is being written"""
+    def __init__(self, items):
+        self.items = items
+
+class StreamedDict:
+    """A JSON object whose (key, value) pairs are produced by an iterable while it is being written"""
+    def __init__(self, items):
+        self.items = items
+
+def dump_json_stream(value, json_file, indent=2, ensure_ascii=True, level=0):
+    """
+    Writes value the way json.dump(value, json_file, indent=indent) would, consuming the
+    StreamedList and StreamedDict it contains as they are written.
+    """
+    if isinstance(value, (dict, StreamedDict)):
+        items, opening, closing = (value.items() if isinstance(value, dict) else value.items), '{', '}'
+    elif isinstance(value, (list, tuple, StreamedList)):
+        items, opening, closing = (value.items if isinstance(value, StreamedList) else value), '[', ']'
+    else:
+        json_file.write(json.dumps(value, ensure_ascii=ensure_ascii))
+        return
+    is_object = opening == '{'
+    empty = True
+    for item in items:
+        json_file.write((opening if empty else ',') + '\n' + ' ' * (indent * (level + 1)))
+        empty = False
+        if is_object:
+            key, item = item
+            json_file.write(json.dumps(key, ensure_ascii=ensure_ascii) + ': ')
+        dump_json_stream(item, json_file, indent, ensure_ascii, level + 1)
+    json_file.write(opening + closing if empty else '\n' + ' ' * (indent * level) + closing)
+
+def write_json_stream(path, value, ensure_ascii=True, encoding=None):
+    with atomic_write(path, encoding=encoding) as json_file:
+        dump_json_stream(value, json_file, ensure_ascii=ensure_ascii)
+
+class JsonStreamReader:
+    """
+    Pull parser that walks a JSON document without loading it whole.
+
+    Containers are entered with iter_object and iter_array, anything else is decoded
+    with read_value. The value of every key yielded by iter_object, and every item of
+    iter_array, must be consumed before moving on to the next one.
+    """
+    CHUNK_SIZE = 64 * 1024
+    WHITESPACE = ' \t\n\r'
+
+    def __init__(self, json_file):
+        self._file = json_file
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def read_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_object(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(':')
+            yield key
+            if self._next_separator('}'):
+                return
+
+    def iter_array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self._next_separator(']'):
+                return
+
+    def _next_separator(self, closing):
+        char = self._peek()
+        self._pos += 1
+        if char == closing:
+            return True
+        if char != ',':
+            raise ValueError(f'Expected , or {closing} but found {char!r}')
+        return False
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f'Expected {char} but found {found!r}')
+        self._pos += 1
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in JsonStreamReader.WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = self._file.read(JsonStreamReader.CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+#endregion Streaming JSON
+
+#region Metrics
+class Metrics:
+    """
+    Thread-safe counters and latency histograms for the hot paths of the chef.
+    """
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._latencies = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._latencies.get(name)
+            if not histogram:
+                histogram = dict(count=0, total=0.0, max=0.0, buckets=[0] * (len(Metrics.LATENCY_BUCKETS) + 1))
+                self._latencies[name] = histogram
+            histogram['count'] += 1
+            histogram['total'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+            bucket = next((i for i, bound in enumerate(Metrics.LATENCY_BUCKETS) if seconds <= bound), len(Metrics.LATENCY_BUCKETS))
+            histogram['buckets'][bucket] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(
+                counters=dict(self._counters),
+                latencies={ name: dict(h, buckets=list(h['buckets'])) for name, h in self._latencies.items() },
+            )
+
+    def merge(self, snapshot):
+        """Adds the metrics collected by another process"""
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, other in snapshot['latencies'].items():
+                histogram = self._latencies.get(name)
+                if not histogram:
+                    self._latencies[name] = dict(other, buckets=list(other['buckets']))
+                    continue
+                histogram['count'] += other['count']
+                histogram['total'] += other['total']
+                histogram['max'] = max(histogram['max'], other['max'])
+                histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._latencies = {}
+
+    def summary(self):
+        snapshot = self.snapshot()
+        counters = snapshot['counters']
+        requests_count = counters.get('http.cache_hits', 0) + counters.get('http.cache_misses', 0)
+        bucket_labels = [f'<={bound}s' for bound in Metrics.LATENCY_BUCKETS] + [f'>{Metrics.LATENCY_BUCKETS[-1]}s']
+        return dict(
+            cache_hit_ratio=counters.get('http.cache_hits', 0) / requests_count if requests_count else None,
+            counters=counters,
+            latencies={
+                name: dict(
+                    count=h['count'],
+                    total_s=round(h['total'], 4),
+                    mean_s=round(h['total'] / h['count'], 4),
+                    max_s=round(h['max'], 4),
+                    histogram=dict(zip(bucket_labels, h['buckets'])),
+                )
+                for name, h in sorted(snapshot['latencies'].items())
+            },
+        )
+
+    def dump(self, path):
+        write_json_stream(path, self.summary())
+
+    def dump_in_background(self, path):
+        """
+        Dumps from a new thread, so that it can be called from a signal handler while
+        the interrupted thread holds the lock.
+        """
+        threading.Thread(target=self.dump, args=(path,), name='metrics-dump', daemon=True).start()
+
+METRICS = Metrics()
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+#endregion Metrics
+
+#region Sqlite
+class SqliteStore:
+    """
+    Single sqlite file shared by the threads and processes of the chef.
+
+    Stores with a WEIGHT, a column or expression of their entries table, are bounded
+    by max_weight: the least recently accessed entries are evicted once the total
+    weight of the entries goes past it.
+
+    Reads would otherwise each write the access time of their entry, so access times
+    are kept in memory and written in batches, along with the next write or eviction.
+    The access times still pending when a process exits are lost, which only makes
+    the eviction order less exact.
+    """
+    # Fraction of max_weight the entries are brought down to, so that eviction does not
+    # run again on the next write
+    EVICTION_TARGET = 0.9
+    # Number of reads whose access times are written at once
+    ACCESS_BATCH_SIZE = 100
+    WEIGHT = None
+    # Columns of the entries table that identify an entry
+    KEY = None
+    EVICTIONS_METRIC = None
+
+    def __init__(self, path, schema, max_weight=None):
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._max_weight = max_weight
+        self._accesses = {}
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            for statement in schema:
+                self._connection.execute(statement)
+            # Other processes write to the same file, so this is only an estimate that
+            # triggers an exact check
+            self._weight = self._total_weight() if self.WEIGHT else 0
+
+    def close(self):
+        with self._lock:
+            with self._connection:
+                self._write_accesses()
+            self._connection.close()
+
+    def _accessed(self, key):
+        """Called with the lock held when the entry of key, a tuple of its KEY columns, is read"""
+        self._accesses[key] = time.time()
+        if len(self._accesses) >= SqliteStore.ACCESS_BATCH_SIZE:
+            with self._connection:
+                self._write_accesses()
+
+    def _write_accesses(self):
+        """Called within a transaction"""
+        if not self._accesses:
+            return
+        where = ' AND '.join(f'{column} = ?' for column in self.KEY)
+        self._connection.executemany(f'UPDATE entries SET accessed = ? WHERE {where}',
+            [(accessed, *key) for key, accessed in self._accesses.items()])
+        self._accesses = {}
+
+    def _total_weight(self):
+        return self._connection.execute(f'SELECT COALESCE(SUM({self.WEIGHT}), 0) FROM entries').fetchone()[0]
+
+    def _added(self, weight):
+        """Called within the transaction that wrote an entry of the given weight"""
+        self._write_accesses()
+        self._weight += weight
+        if self._max_weight and self._weight > self._max_weight:
+            self._evict()
+
+    def _evict(self):
+        self._weight = self._total_weight()
+        excess = self._weight - int(self._max_weight * SqliteStore.EVICTION_TARGET)
+        if self._weight <= self._max_weight or excess <= 0:
+            return
+        rowids = []
+        for rowid, weight in self._connection.execute(f'SELECT rowid, {self.WEIGHT} FROM entries ORDER BY accessed'):
+            if excess <= 0:
+                break
+            rowids.append((rowid,))
+            excess -= weight
+            self._weight -= weight
+        self._connection.executemany('DELETE FROM entries WHERE rowid = ?', rowids)
+        METRICS.increment(self.EVICTIONS_METRIC, len(rowids))
+#endregion Sqlite
+
+#region HTTP archive
+class HttpArchive(SqliteStore):
+    """
+    Single-file sqlite archive of HTTP responses, indexed by method and URL.
+
+    Bodies are stored decoded and zlib compressed.
+    """
+    # Headers that describe the transfer of the original body rather than its content
+    TRANSFER_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+    # Request headers whose responses may answer for part of the resource, or for none of it
+    PARTIAL_REQUEST_HEADERS = ('if-none-match', 'if-modified-since', 'if-match', 'if-unmodified-since', 'if-range', 'range')
+
+    def __init__(self, path):
+        super(HttpArchive, self).__init__(path, [
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'method TEXT, url TEXT, status INTEGER, reason TEXT, headers TEXT, body BLOB, '
+            'PRIMARY KEY (method, url))'
+        ])
+
+    def record(self, request, response):
+        # A 304 or 206 answers one conditional or Range request only, and would be replayed
+        # for every request of the URL in place of its full response
+        partial = any(name.lower() in HttpArchive.PARTIAL_REQUEST_HEADERS for name in request.headers)
+        if partial and response.status_code != 200:
+            return
+        headers = { k: v for k, v in response.headers.items() if k.lower() not in HttpArchive.TRANSFER_HEADERS }
+        row = (request.method, request.url, response.status_code, response.reason, json.dumps(headers), zlib.compress(response.content))
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)', row)
+
+    def lookup(self, method, url):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT status, reason, headers, body FROM responses WHERE method = ? AND url = ?', (method, url)
+            ).fetchone()
+        if not row:
+            return None
+        status, reason, headers, body = row
+        return status, reason, json.loads(headers), zlib.decompress(body)
+
+def build_archived_response(request, status, reason, headers, body):
+    headers = CaseInsensitiveDict(headers)
+    headers['Content-Length'] = str(len(body))
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = headers
+    response.raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, preload_content=False)
+    response.encoding = get_encoding_from_headers(headers)
+    response.url = request.url
+    response.request = request
+    response.from_cache = True
+    return response
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self, adapter, archive):
+        super(RecordingAdapter, self).__init__()
+        self._adapter = adapter
+        self._archive = archive
+
+    def send(self, request, **kwargs):
+        response = self._adapter.send(request, **kwargs)
+        self._archive.record(request, response)
+        # Recording reads the whole body, so streaming callers get it back through a new raw,
+        # which holds the decoded body and no longer has the headers of its transfer
+        headers = CaseInsensitiveDict({ k: v for k, v in response.headers.items() if k.lower() not in HttpArchive.TRANSFER_HEADERS })
+        headers['Content-Length'] = str(len(response.content))
+        response.headers = headers
+        response.raw = HTTPResponse(body=io.BytesIO(response.content), headers=headers,
+            status=response.status_code, preload_content=False)
+        return response
+
+    def close(self):
+        self._adapter.close()
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, archive):
+        super(ReplayAdapter, self).__init__()
+        self._archive = archive
+
+    def send(self, request, **kwargs):
+        archived = self._archive.lookup(request.method, request.url)
+        if not archived:
+            raise requests.ConnectionError(f'{request.method} {request.url} is not in the HTTP archive', request=request)
+        return build_archived_response(request, *archived)
+
+    def close(self):
+        pass
+#endregion HTTP archive
+
+#region HTTP cache
+def create_http_cache(cache_type='file', memory_size_mb=64, max_size_mb=None):
+    if cache_type == 'tiered':
+        max_size = max_size_mb * 1024 * 1024 if max_size_mb else None
+        return TieredCache(SqliteCache('.webcache.sqlite', max_size), (memory_size_mb or 64) * 1024 * 1024)
+    return FileCache('.webcache')
+
+class SqliteCache(SqliteStore, BaseCache):
+    """
+    Single-file CacheControl cache, shared by every process of the chef.
+
+    When max_size bytes is given, the least recently read entries are evicted once
+    the cache grows past it.
+    """
+    WEIGHT = 'size'
+    KEY = ('key',)
+    EVICTIONS_METRIC = 'http_cache.evictions'
+
+    def __init__(self, path, max_size=None):
+        super(SqliteCache, self).__init__(path, [
+            'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)',
+            'CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)',
+        ], max_size)
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+            if row:
+                self._accessed((key,))
+        METRICS.increment('http_cache.disk_hits' if row else 'http_cache.disk_misses')
+        return row[0] if row else None
+
+    def set(self, key, value, expires=None):
+        # Like FileCache, expires is ignored: freshness is decided by CacheControl from
+        # the cached headers
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+            self._added(len(value))
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def stats(self):
+        with self._lock:
+            count, size = self._connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return dict(entries=count, size=size, max_size=self._max_weight)
+
+class TieredCache(BaseCache):
+    """
+    CacheControl cache keeping the most recently used entries in memory, up to
+    memory_size bytes, in front of a slower cache that persists between runs.
+    """
+    def __init__(self, cache, memory_size):
+        self._cache = cache
+        self._memory_size = memory_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is not None:
+            METRICS.increment('http_cache.memory_hits')
+            return value
+        value = self._cache.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key, value, expires=None):
+        self._cache.set(key, value, expires)
+        self._remember(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._forget(key)
+        self._cache.delete(key)
+
+    def close(self):
+        self._cache.close()
+
+    def stats(self):
+        with self._lock:
+            memory = dict(entries=len(self._entries), size=self._size, max_size=self._memory_size)
+        return dict(memory=memory, disk=self._cache.stats())
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._forget(key)
+            if len(value) > self._memory_size:
+                return
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self._memory_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _forget(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._size -= len(value)
+#endregion HTTP cache
+
+#region Parse memo
+def response_validator(response):
+    """Returns the ETag of the response, or a hash of its content when it has none"""
+    return response.headers.get('ETag') or hashlib.sha256(response.content).hexdigest()
+
+class ParseMemo(SqliteStore):
+    """
+    Values extracted from parsed pages, reused for as long as the page they were
+    extracted from has the same validator.
+
+    Entries are stored as JSON in a single sqlite file, and the least recently used
+    ones are evicted once there are more than max_entries.
+    """
+    WEIGHT = '1'
+    KEY = ('url', 'name')
+    EVICTIONS_METRIC = 'parse_memo.evictions'
+
+    def __init__(self, path, max_entries=None):
+        super(ParseMemo, self).__init__(path, [
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'url TEXT, name TEXT, validator TEXT, value TEXT, accessed REAL, '
+            'PRIMARY KEY (url, name))',
+            'CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)',
+        ], max_entries)
+
+    def get(self, url, name, validator):
+        """Returns whether a value was found, and the value"""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM entries WHERE url = ? AND name = ? AND validator = ?', (url, name, validator)
+            ).fetchone()
+            if row:
+                self._accessed((url, name))
+        METRICS.increment('parse_memo.hits' if row else 'parse_memo.misses')
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def put(self, url, name, validator, value):
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                (url, name, validator, json.dumps(value), time.time()))
+            self._added(1)
+
+    def invalidate(self, url=None):
+        """Drops the values extracted from the page at url, or every value when url is None"""
+        with self._lock, self._connection:
+            if url is None:
+                self._connection.execute('DELETE FROM entries')
+            else:
+                self._connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self._weight = self._total_weight()
+#endregion Parse memo
+
+#region Rate limiting
+class TokenBucket:
+    """
+    Request budget of a host: rate requests per second, in bursts of up to one second
+    worth of requests. A rate of None leaves the host unlimited until it throttles.
+
+    The rate adapts to the host. It is halved whenever the host throttles, starting
+    from the rate requests were actually sent at, and grows back by RATE_INCREASE with
+    every request that goes through, up to the configured rate.
+    """
+    MIN_RATE = 0.5
+    RATE_INCREASE = 0.05
+    # Requests sent concurrently are throttled together, and only count once
+    THROTTLE_COOLDOWN = 1.0
+
+    def __init__(self, rate=None):
+        self._max_rate = rate
+        self._rate = rate
+        self._tokens = self._capacity()
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._throttled_at = 0
+        self._sent = 0
+        self._sent_since = self._updated
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent to the host, and returns the seconds waited"""
+        waited = 0
+        while True:
+            with self._lock:
+                delay = self._reserve()
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def refund(self):
+        """Gives back the token of a request the host never saw, served from the cache"""
+        with self._lock:
+            if self._rate is not None:
+                self._tokens = min(self._capacity(), self._tokens + 1)
+            self._sent -= 1
+
+    def succeeded(self):
+        with self._lock:
+            if self._rate is not None and (self._max_rate is None or self._rate < self._max_rate):
+                self._rate += TokenBucket.RATE_INCREASE
+                if self._max_rate is not None:
+                    self._rate = min(self._rate, self._max_rate)
+
+    def throttled(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                # Holds back every request to the host, not only the one being retried
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._throttled_at < TokenBucket.THROTTLE_COOLDOWN:
+                return
+            self._throttled_at = now
+            sent_rate = self._sent / max(now - self._sent_since, 1)
+            self._rate = max(TokenBucket.MIN_RATE, min(self._rate or sent_rate, sent_rate) / 2)
+            self._tokens = 0
+            self._updated = now
+            self._sent = 0
+            self._sent_since = now
+
+    def _capacity(self):
+        return max(1, self._rate or 1)
+
+    def _reserve(self):
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._rate is not None:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self._rate
+            self._tokens -= 1
+        self._sent += 1
+        return 0
+
+def retry_after_seconds(response):
+    """Returns the delay asked for by the Retry-After header of response, if any"""
+    retry_after = response.headers.get('Retry-After')
+    if not retry_after:
+        return None
+    if retry_after.strip().isdigit():
+        return int(retry_after)
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_at.timestamp() - time.time())
+#endregion Rate limiting
+
+def declared_encoding(response):
+    # Without a known encoding BeautifulSoup falls back to character set detection,
+    # which can take longer than parsing the page itself
+    content_type = response.headers.get('Content-Type', '')
+    return response.encoding if 'charset=' in content_type.lower() else None
+
 class Html:
-    def __init__(self, http_session, logger):
+    # Requests answered with these are sent again, after a jittered exponential backoff
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    THROTTLE_STATUSES = (429, 503)
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 30
+    # Longer Retry-After delays are not waited for, and the response is returned as is
+    MAX_RETRY_AFTER = 120
+
+    def __init__(self, http_session, logger, max_connections_per_host=None, parser='html.parser'):
         self._http_session = http_session
         self._logger = logger
+        self._parser = parser
+        self._max_connections_per_host = max_connections_per_host
+        self._host_semaphores = {}
+        self._host_semaphores_lock = threading.Lock()
+        self._parse_memo = None
+        self._max_retries = 0
+        self._requests_per_second = None
+        self._host_buckets = {}
+
+    def set_http_session(self, http_session):
+        self._http_session = http_session
 
-    def get(self, url, *args, **kwargs):
-        response = self._http_session.get(url, *args, **kwargs)
+    def set_parse_memo(self, parse_memo):
+        self._parse_memo = parse_memo
+
+    def limit_connections_per_host(self, max_connections):
+        with self._host_semaphores_lock:
+            if max_connections != self._max_connections_per_host:
+                self._host_semaphores = {}
+            self._max_connections_per_host = max_connections
+
+    def limit_request_rate(self, requests_per_second):
+        """Starting rate of every host, None to leave hosts unlimited until they throttle"""
+        with self._host_semaphores_lock:
+            if requests_per_second != self._requests_per_second:
+                self._host_buckets = {}
+            self._requests_per_second = requests_per_second
+
+    def set_max_retries(self, max_retries):
+        self._max_retries = max_retries
+
+    def set_parser(self, parser):
+        self._parser = parser
+
+    def _send(self, method, url, *args, **kwargs):
+        host = urlparse(url).netloc
+        bucket = self._host_bucket(host)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            waited = bucket.acquire()
+            if waited:
+                METRICS.observe('http.rate_limit_wait', waited)
+            try:
+                response = self._send_in_host_slot(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self._max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                self._logger.warning(f'{e.__class__.__name__} for {url}, retrying in {delay:.1f}s')
+            else:
+                if getattr(response, 'from_cache', False):
+                    bucket.refund()
+                if response.status_code not in Html.RETRY_STATUSES:
+                    bucket.succeeded()
+                    break
+                retry_after = retry_after_seconds(response)
+                too_long = (retry_after or 0) > Html.MAX_RETRY_AFTER
+                throttled = response.status_code in Html.THROTTLE_STATUSES
+                if throttled:
+                    METRICS.increment('http.throttled')
+                    bucket.throttled(None if too_long else retry_after)
+                if attempt >= self._max_retries or too_long:
+                    break
+                if retry_after is None:
+                    delay = self._backoff(attempt)
+                else:
+                    # The bucket of a throttling host already waits for Retry-After, along
+                    # with every other request to the host
+                    delay = 0 if throttled else retry_after
+                self._logger.warning(f'STATUS: {response.status_code}, URL: {url}, retrying in {retry_after if retry_after is not None else delay:.1f}s')
+                response.close()
+            METRICS.increment('http.retries')
+            time.sleep(delay)
+            attempt += 1
+        METRICS.observe(f'http.{method}.{host}', time.perf_counter() - start)
+        METRICS.increment('http.cache_hits' if getattr(response, 'from_cache', False) else 'http.cache_misses')
+        if kwargs.get('stream'):
+            METRICS.increment('http.bytes', int(response.headers.get('Content-Length') or 0))
+        else:
+            METRICS.increment('http.bytes', len(response.content))
+        return response
+
+    def _backoff(self, attempt):
+        # Full jitter spreads out the retries of requests that failed together
+        return random.uniform(0, min(Html.BACKOFF_MAX, Html.BACKOFF_BASE * 2 ** attempt))
+
+    def _host_bucket(self, host):
+        with self._host_semaphores_lock:
+            bucket = self._host_buckets.get(host)
+            if not bucket:
+                bucket = TokenBucket(self._requests_per_second)
+                self._host_buckets[host] = bucket
+        return bucket
+
+    def _send_in_host_slot(self, method, url, *args, **kwargs):
+        release_slot = self._acquire_host_slot(url)
+        try:
+            response = getattr(self._http_session, method)(url, *args, **kwargs)
+        except BaseException:
+            release_slot()
+            raise
+        if not kwargs.get('stream'):
+            release_slot()
+            return response
+        # The body of a streamed response is read after it is returned, over the connection
+        # of the slot, so the slot is only freed once the response is closed
+        close = response.close
+        def close_and_release_slot():
+            try:
+                close()
+            finally:
+                release_slot()
+        response.close = close_and_release_slot
+        return response
+
+    def _acquire_host_slot(self, url):
+        """Waits for a free connection to the host of url, and returns the function that frees it"""
+        if not self._max_connections_per_host:
+            return lambda: None
+        host = urlparse(url).netloc
+        with self._host_semaphores_lock:
+            semaphore = self._host_semaphores.get(host)
+            if not semaphore:
+                semaphore = threading.BoundedSemaphore(self._max_connections_per_host)
+                self._host_semaphores[host] = semaphore
+        semaphore.acquire()
+        released = threading.Event()
+        def release():
+            if not released.is_set():
+                released.set()
+                semaphore.release()
+        return release
+
+    def get(self, url, *args, parse_only=None, **kwargs):
+        """
+        Fetches and parses the page at url. Pass a SoupStrainer as parse_only to only
+        build the part of the tree the caller looks at.
+        """
+        return self._parse_html(self._get_page(url, *args, **kwargs), parse_only)
+
+    def get_extracted(self, url, extract, parse_only=None):
+        """
+        Fetches the page at url and returns extract(page). With a parse memo, the value
+        is reused without parsing the page for as long as the page does not change.
+        extract must return JSON serializable values.
+        """
+        response = self._get_page(url)
+        return self._extract(url, response, extract, lambda: self._parse_html(response, parse_only))
+
+    def _get_page(self, url, *args, **kwargs):
+        response = self._send('get', url, *args, **kwargs)
         if response.status_code != 200:
-            self._logger.error("STATUS: {}, URL: {}", response.status_code, url)
+            self._logger.error("STATUS: %s, URL: %s", response.status_code, url)
         elif not response.from_cache:
-            self._logger.debug("NOT CACHED:", url)
-        return BeautifulSoup(response.content, "html.parser")
+            self._logger.debug("NOT CACHED: %s", url)
+        return response
+
+    def _parse_html(self, response, parse_only):
+        with METRICS.timer('parse.html'):
+            return BeautifulSoup(response.content, self._parser, parse_only=parse_only, from_encoding=declared_encoding(response))
+
+    def _extract(self, url, response, extract, parse):
+        if not self._parse_memo:
+            return extract(parse())
+        # The parser is part of the name, since backends may build different trees
+        name = f'{extract.__name__}.{self._parser}'
+        validator = response_validator(response)
+        found, value = self._parse_memo.get(url, name, validator)
+        if found:
+            return value
+        value = extract(parse())
+        self._parse_memo.put(url, name, validator, value)
+        return value
 
     def get_image(self, url):
-        return self._http_session.get(url, stream=True)
-
-    def get_xml(self, url):
-        return BeautifulSoup(self._http_session.get(url).content, 'xml')
+        """Streams the image at url. The response holds a connection to the host until it is closed."""
+        return self._send('get', url, stream=True)
+
+    def get_stream(self, url, headers=None):
+        """
+        Streams the body at url past the HTTP cache, for files too large to be cached.
+        The body is requested without content encoding, so that byte ranges and sizes
+        apply to the file itself. The response is used as a context manager, and counts
+        against the connections to the host until it exits.
+        """
+        headers = dict(headers or {})
+        headers.update({ 'Cache-Control': 'no-cache, no-store', 'Accept-Encoding': 'identity' })
+        return self._send('get', url, stream=True, headers=headers)
+
+    def get_xml_if_modified(self, url, etag=None, last_modified=None, parse_only=None, extract=None):
+        """
+        Returns the parsed document, or extract(document) when extract is given, and the
+        validators of the response. The document is None when it was not modified.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = self._send('get', url, headers=headers)
+        validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        # CacheControl may answer a 304 with the cached 200 response, so unchanged
+        # validators also mean the document has not been modified
+        if response.status_code == 304 or ((etag or last_modified) and validators == (etag, last_modified)):
+            return None, etag, last_modified
+        def parse():
+            with METRICS.timer('parse.xml'):
+                return BeautifulSoup(response.content, 'xml', parse_only=parse_only)
+        page = self._extract(url, response, extract, parse) if extract else parse()
+        return page, validators[0], validators[1]
 
     def head(self, url):
-        return self._http_session.head(url)
+        return self._send('head', url)
+
+class KeyedLocks:
+    """
+    A lock per key, such as the URL a thread is downloading. The lock of a key is
+    dropped once no thread holds it or waits for it.
+    """
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.get(key)
+            if not entry:
+                entry = [threading.Lock(), 0]
+                self._locks[key] = entry
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locks)
+
+class ImageStore:
+    """
+    Content-addressed store of downloaded images.
+
+    Images are stored once under the sha256 of their content and indexed by URL, so an
+    image shared by several stories is downloaded and written to disk only once per run.
+    Story zips read their images straight from the store.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, html, base_dir, since=None):
+        self._html = html
+        self._objects_dir = os.path.join(base_dir, 'objects')
+        self._urls_dir = os.path.join(base_dir, 'urls')
+        # URL index entries written after `since` were fetched during this run, possibly by
+        # another scraping process
+        self._since = since
+        self._paths_by_url = {}
+        self._url_locks = KeyedLocks()
+
+    def get(self, url):
+        # Threads asking for the same image wait for the one downloading it
+        with self._url_locks.hold(url):
+            if url in self._paths_by_url:
+                return self._paths_by_url[url]
+            path = self._lookup(url) if self._since else None
+            if not path:
+                path = self._download(url)
+            self._paths_by_url[url] = path
+            return path
+
+    def _lookup(self, url):
+        url_path = self._url_path(url)
+        if not os.path.exists(url_path) or os.path.getmtime(url_path) < self._since:
+            return None
+        object_path = self._object_path(self.content_hash(url))
+        return object_path if os.path.exists(object_path) else None
+
+    def _download(self, url):
+        response = self._html.get_image(url)
+        try:
+            if response.status_code != 200:
+                return None
+            pathlib.Path(self._objects_dir).mkdir(parents=True, exist_ok=True)
+            digest = hashlib.sha256()
+            fd, tmp_path = tempfile.mkstemp(dir=self._objects_dir)
+            with os.fdopen(fd, 'wb') as f:
+                response.raw.decode_content = True
+                for chunk in iter(lambda: response.raw.read(ImageStore.CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+        finally:
+            # Streamed responses hold their connection until they are closed
+            response.close()
+        content_hash = digest.hexdigest()
+        object_path = self._object_path(content_hash)
+        if os.path.exists(object_path):
+            os.remove(tmp_path)
+        else:
+            pathlib.Path(os.path.dirname(object_path)).mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, object_path)
+        with atomic_write(self._url_path(url)) as url_file:
+            url_file.write(content_hash)
+        return object_path
+
+    def content_hash(self, url):
+        """Returns the hash of the image last downloaded from url, in this or any previous run"""
+        url_path = self._url_path(url)
+        if not os.path.exists(url_path):
+            return None
+        with open(url_path, 'r') as url_file:
+            return url_file.read().strip()
+
+    def _object_path(self, content_hash):
+        return os.path.join(self._objects_dir, content_hash[:2], content_hash)
+
+    def _url_path(self, url):
+        url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self._urls_dir, url_hash[:2], url_hash)
+
+class ImageOptimizer:
+    """
+    Downscales images of the ImageStore to max_dimension pixels and recompresses them
+    with the given JPEG quality.
+
+    Optimized images are cached by the content hash of their source and the settings,
+    and an image that cannot be made smaller is kept as is.
+    """
+    FORMATS = ('JPEG', 'PNG')
+    # Bumped when the optimized images change for the same settings, which are part of
+    # the cache path and of the fingerprint of the zips
+    VERSION = 2
+
+    def __init__(self, base_dir, max_dimension=1024, quality=75):
+        self._max_dimension = max_dimension
+        self._quality = quality
+        self.settings = f'{max_dimension}px_q{quality}_v{ImageOptimizer.VERSION}'
+        self._base_dir = os.path.join(base_dir, self.settings)
+
+    def optimize(self, object_path):
+        """Returns the path of the optimized copy of the image stored at object_path"""
+        content_hash = os.path.basename(object_path)
+        optimized_path = os.path.join(self._base_dir, content_hash[:2], content_hash)
+        if not os.path.exists(optimized_path):
+            self._optimize(object_path, optimized_path)
+        METRICS.increment('images.optimized')
+        METRICS.increment('images.bytes_saved', os.path.getsize(object_path) - os.path.getsize(optimized_path))
+        return optimized_path
+
+    def _optimize(self, object_path, optimized_path):
+        # Pillow is only needed when images are optimized
+        from PIL import Image, ImageOps
+
+        pathlib.Path(os.path.dirname(optimized_path)).mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(optimized_path))
+        os.close(fd)
+        with METRICS.timer('images.optimize'):
+            try:
+                with Image.open(object_path) as image:
+                    image_format = image.format
+                    if image_format not in ImageOptimizer.FORMATS:
+                        raise OSError(f'{image_format} images are not optimized')
+                    # Lets the JPEG decoder skip the resolution that is thrown away anyway
+                    image.draft(image.mode, (self._max_dimension, self._max_dimension))
+                    # Saving drops the EXIF orientation, so the pixels are rotated instead
+                    oriented_image = ImageOps.exif_transpose(image)
+                    oriented_image.thumbnail((self._max_dimension, self._max_dimension))
+                    if image_format == 'JPEG':
+                        oriented_image.save(tmp_path, 'JPEG', quality=self._quality, optimize=True)
+                    else:
+                        oriented_image.save(tmp_path, 'PNG', optimize=True)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                shutil.copyfile(object_path, tmp_path)
+        if os.path.getsize(tmp_path) >= os.path.getsize(object_path):
+            shutil.copyfile(object_path, tmp_path)
+        os.replace(tmp_path, optimized_path)
+
+class IncompleteDownload(Exception):
+    """A download that stopped short or came out corrupted, and is worth starting again"""
+
+class MediaStore:
+    """
+    Audio and document files downloaded ahead of the ricecooker upload.
+
+    Files are streamed to disk in chunks. A download that was interrupted is resumed
+    with a Range request, and every file is checked against the size announced by
+    the server and its MD5 when the server provides one, either as Content-MD5 or as
+    an ETag that is an MD5. The ETag, size and MD5 of each file are kept next to it,
+    so later runs only revalidate it.
+    """
+    CHUNK_SIZE = 256 * 1024
+    RETRIES = 3
+    # Seconds waited before the first retry, doubled before each of the next ones
+    RETRY_DELAY = 1
+    MD5_ETAG_RE = compile(r'^"?(?P<md5>[0-9a-f]{32})"?$')
+
+    def __init__(self, html, base_dir):
+        self._html = html
+        self._base_dir = base_dir
+        self._paths_by_url = {}
+        self._url_locks = KeyedLocks()
+
+    def get(self, url):
+        # Threads prefetching the same file wait for the one downloading it, rather than
+        # writing to the same .part file at the same time
+        with self._url_locks.hold(url):
+            path = self._paths_by_url.get(url)
+            if path and os.path.exists(path):
+                METRICS.increment('prefetch.reused')
+                return path
+            path = self._get(url)
+            self._paths_by_url[url] = path
+            return path
+
+    def _get(self, url):
+        # Failed requests are already retried by Html, so only the downloads that broke
+        # off or came out corrupted are started again
+        for attempt in range(MediaStore.RETRIES):
+            try:
+                return self._download(url)
+            except IncompleteDownload:
+                if attempt == MediaStore.RETRIES - 1:
+                    raise
+                METRICS.increment('prefetch.retries')
+                time.sleep(MediaStore.RETRY_DELAY * 2 ** attempt)
+
+    def _download(self, url):
+        path = self._path(url)
+        part_path = path + '.part'
+        entry = self._read_entry(path)
+        headers = {}
+        offset = 0
+        if entry and entry['complete'] and os.path.exists(path) and os.path.getsize(path) == entry['size']:
+            if not entry['etag']:
+                METRICS.increment('prefetch.reused')
+                return path
+            headers['If-None-Match'] = entry['etag']
+        elif entry and entry['etag'] and os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+            headers['Range'] = f'bytes={offset}-'
+            # The rest of the file is only sent if it is still the same file
+            headers['If-Range'] = entry['etag']
+
+        # The transfer runs while the response holds one of the connections to the host
+        with METRICS.timer('prefetch.file'), self._html.get_stream(url, headers=headers) as response:
+            if response.status_code == 304:
+                METRICS.increment('prefetch.reused')
+                return path
+            if response.status_code == 416:
+                os.remove(part_path)
+                raise IncompleteDownload(f'Range not satisfiable, restarting download of {url}')
+            if response.status_code == 206 and self._range_start(response) == offset:
+                METRICS.increment('prefetch.resumed')
+                expected_size = self._range_total(response)
+            elif response.status_code == 200:
+                offset = 0
+                content_length = response.headers.get('Content-Length')
+                expected_size = int(content_length) if content_length else None
+            else:
+                raise Exception(f'STATUS: {response.status_code}, URL: {url}')
+            etag = response.headers.get('ETag')
+            self._write_entry(path, dict(url=url, etag=etag, size=expected_size, md5=None, complete=False))
+            md5 = self._part_md5(part_path) if offset else hashlib.md5()
+            with open(part_path, 'ab' if offset else 'wb') as part_file:
+                try:
+                    for chunk in iter(lambda: response.raw.read(MediaStore.CHUNK_SIZE), b''):
+                        md5.update(chunk)
+                        part_file.write(chunk)
+                        METRICS.increment('prefetch.bytes', len(chunk))
+                except Urllib3HTTPError as e:
+                    raise IncompleteDownload(f'Download of {url} broke off: {e}') from e
+
+        size = os.path.getsize(part_path)
+        if expected_size is not None and size < expected_size:
+            # Kept, so that the next attempt resumes from here
+            raise IncompleteDownload(f'Incomplete download of {url}: {size} of {expected_size} bytes')
+        expected_md5 = self._expected_md5(response)
+        if (expected_size is not None and size > expected_size) or (expected_md5 and md5.hexdigest() != expected_md5):
+            os.remove(part_path)
+            raise IncompleteDownload(f'Size or checksum mismatch for {url}')
+        os.replace(part_path, path)
+        self._write_entry(path, dict(url=url, etag=etag, size=size, md5=md5.hexdigest(), complete=True))
+        METRICS.increment('prefetch.downloaded')
+        return path
+
+    def _range_start(self, response):
+        # Content-Range: bytes <start>-<end>/<total>
+        content_range = response.headers.get('Content-Range', '')
+        try:
+            return int(content_range.split()[1].split('-')[0])
+        except (IndexError, ValueError):
+            return None
+
+    def _range_total(self, response):
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+
+    def _expected_md5(self, response):
+        content_md5 = response.headers.get('Content-MD5')
+        if content_md5:
+            return base64.b64decode(content_md5).hex()
+        m = MediaStore.MD5_ETAG_RE.match(response.headers.get('ETag') or '')
+        return m.group('md5') if m else None
+
+    def _part_md5(self, part_path):
+        md5 = hashlib.md5()
+        with open(part_path, 'rb') as part_file:
+            for chunk in iter(lambda: part_file.read(MediaStore.CHUNK_SIZE), b''):
+                md5.update(chunk)
+        return md5
+
+    def _path(self, url):
+        url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        extension = os.path.splitext(urlparse(url).path)[1]
+        return os.path.join(self._base_dir, url_hash[:2], url_hash + extension)
+
+    def _read_entry(self, path):
+        if not os.path.exists(path + '.json'):
+            return None
+        with open(path + '.json', 'r') as entry_file:
+            return json.load(entry_file)
+
+    def _write_entry(self, path, entry):
+        with atomic_write(path + '.json') as entry_file:
+            json.dump(entry, entry_file)
+
+class PredictableZip:
+    """
+    Zip built from bytes and files as they are added, without copying them into a
+    directory first.
+
+    Entries are written in sorted order with the neutral metadata of ricecooker's
+    create_predictable_zip, so the zip is byte-identical to the one it makes of a
+    directory holding the same files. With store_media, already compressed images are
+    stored as is rather than deflated again, which is faster but no longer identical.
+    """
+    DATE_TIME = (2015, 10, 21, 7, 28, 0)
+    STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, store_media=False):
+        self._store_media = store_media
+        self._entries = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def add_bytes(self, arcname, data):
+        with self._lock:
+            self._entries[arcname] = data
+
+    def add_file(self, arcname, path, position=0):
+        """
+        Files added concurrently give their position in document order. Like files copied
+        one after the other into a directory, the last one at an arcname is kept.
+        """
+        with self._lock:
+            if arcname in self._positions and self._positions[arcname] > position:
+                return
+            self._entries[arcname] = path
+            self._positions[arcname] = position
+
+    def write(self, path):
+        # A failed story does not leave a partial zip behind
+        with atomic_write(path, 'wb', suffix='.zip') as zip_file, \
+                zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_DEFLATED) as output_zip:
+            for arcname in sorted(self._entries):
+                self._write_entry(output_zip, arcname, self._entries[arcname])
+        return path
+
+    def _write_entry(self, output_zip, arcname, source):
+        info = zipfile.ZipInfo(arcname, date_time=PredictableZip.DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        if self._store_media and os.path.splitext(arcname)[1].lower() in PredictableZip.STORED_EXTENSIONS:
+            info.compress_type = zipfile.ZIP_STORED
+        info.create_system = 0
+        if isinstance(source, bytes):
+            output_zip.writestr(info, source)
+            return
+        with open(source, 'rb') as source_file, output_zip.open(info, 'w') as entry:
+            shutil.copyfileobj(source_file, entry, PredictableZip.CHUNK_SIZE)
+
+class ZipManifest:
+    """
+    Fingerprints of the HTML5 zips built by previous runs.
+
+    Entries are stored one file per source_id, so scraping processes can update the
+    manifest concurrently.
+    """
+    def __init__(self, base_dir):
+        self._base_dir = base_dir
+
+    def get(self, source_id, fingerprint):
+        entry_path = self._entry_path(source_id)
+        if not os.path.exists(entry_path):
+            return None
+        with open(entry_path, 'r') as entry_file:
+            entry = json.load(entry_file)
+        if entry['fingerprint'] != fingerprint or not os.path.exists(entry['zip_path']):
+            return None
+        return entry['zip_path']
+
+    def zip_path(self, source_id, fingerprint):
+        # Zips are deterministic, so a zip can be named after the fingerprint of its content.
+        # Aliased stories may have the same content, and each of them gets its own zip
+        return os.path.join(self._base_dir, f'{self._source_id_hash(source_id)}-{fingerprint}.zip')
+
+    def put(self, source_id, fingerprint, zip_path):
+        """Records the zip written to zip_path(source_id, fingerprint) as the one of source_id"""
+        entry_path = self._entry_path(source_id)
+        previous_zip_path = None
+        if os.path.exists(entry_path):
+            with open(entry_path, 'r') as entry_file:
+                previous_zip_path = json.load(entry_file)['zip_path']
+        entry = dict(source_id=source_id, fingerprint=fingerprint, zip_path=zip_path)
+        with atomic_write(entry_path) as entry_file:
+            json.dump(entry, entry_file)
+        # Zips named after the fingerprint alone may still be the zip of an aliased story
+        if previous_zip_path and previous_zip_path != zip_path \
+                and os.path.basename(previous_zip_path).startswith(self._source_id_hash(source_id) + '-'):
+            try:
+                os.remove(previous_zip_path)
+            except FileNotFoundError:
+                pass
+        return zip_path
+
+    def _entry_path(self, source_id):
+        return os.path.join(self._base_dir, 'manifest', self._source_id_hash(source_id) + '.json')
+
+    def _source_id_hash(self, source_id):
+        return hashlib.sha256(source_id.encode('utf-8')).hexdigest()
+
+class StoryIndex:
+    """
+    Identities of the stories crawled so far: their canonical and short links, and a
+    hash of their content. Stories that share any of them are aliases of one story.
+    """
+    IDENTITY_KEYS = ('canonical', 'shortlink', 'content_hash')
+
+    def __init__(self):
+        self._urls_by_key = {}
+        self._urls = set()
+
+    def add(self, url, identity):
+        """Returns the URL of the story url is an alias of, or None for a new story"""
+        if url in self._urls:
+            return url
+        self._urls.add(url)
+        keys = [f'{name}:{identity[name]}' for name in StoryIndex.IDENTITY_KEYS if identity.get(name)]
+        primary_url = next((self._urls_by_key[key] for key in keys if key in self._urls_by_key), None)
+        for key in keys:
+            self._urls_by_key.setdefault(key, primary_url or url)
+        return primary_url
+
+class ScrapeJournal:
+    """
+    Append-only log of the stories scraped so far and the nodes they produced, one JSON
+    line per story.
+
+    Stories are keyed by a hash of their crawled data, so a story that changed since it
+    was journaled is scraped again.
+    """
+    def __init__(self, path, resume=False):
+        self._path = path
+        self._entries = self._load() if resume else {}
+        # Rewritten with only the valid entries, which also drops a line left half
+        # written by a run that was killed
+        with atomic_write(path) as journal_file:
+            journal_file.write(''.join(json.dumps(entry) + '\n' for entry in self._entries.values()))
+        self._file = open(path, 'a')
+
+    def get(self, story):
+        return self._entries.get(ScrapeJournal.story_key(story))
+
+    def record(self, story, node):
+        entry = dict(key=ScrapeJournal.story_key(story), node=node)
+        self._entries[entry['key']] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def story_key(story):
+        return hashlib.sha256(json.dumps(story, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _load(self):
+        entries = {}
+        if not os.path.exists(self._path):
+            return entries
+        with open(self._path, 'r') as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                # The zip of a story may have been cleaned up since it was journaled
+                files = (entry['node'] or {}).get('files', [])
+                if all(f['path'].startswith('http') or os.path.exists(f['path']) for f in files):
+                    entries[entry['key']] = entry
+        return entries
+
+#region Languages
+class LanguageTable:
+    """
+    Resolves the language names found on the site to le_utils language codes.
+
+    getlang_by_name and getlang_by_native_name scan the whole language list for
+    every name they do not find, so the names and native names of every language,
+    and the site's own spellings in ALIASES, are indexed once, case and whitespace
+    insensitively, and every name is resolved once. Unknown names fall back to
+    English, and are logged once and counted per node in the languages.unknown
+    metrics.
+    """
+    # Names used on the site for languages le_utils knows under another name
+    ALIASES = {
+        'sotho': 'Sesotho',
+        'ndebele': 'North Ndebele',
+        'tsivenda': 'Tshivenda',
+        'seswati': 'Siswati',
+        'tsw': 'Setswana',
+        'continue reading': 'English',
+    }
+    UNKNOWN_METRIC_PREFIX = 'languages.unknown.'
+
+    def __init__(self, logger, default_name='English'):
+        self._logger = logger
+        self._default_name = default_name
+        self._indexes = None
+        self._codes = {}
+        self._unknown_names = set()
+        self._lock = threading.Lock()
+
+    def name(self, name):
+        """Returns the name le_utils knows the language of name under, when the site spells it differently"""
+        return LanguageTable.ALIASES.get(LanguageTable.normalize(name), name)
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if not code:
+            with self._lock:
+                if name not in self._codes:
+                    self._codes[name] = self._resolve(name)
+                code = self._codes[name]
+        if name in self._unknown_names:
+            METRICS.increment(LanguageTable.UNKNOWN_METRIC_PREFIX + name)
+        return code
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(name.split()).casefold()
+
+    @staticmethod
+    def _simple_name(name):
+        # The name without the variant after a comma, nor the qualifier in brackets
+        return name.split(',')[0].split('(')[0].strip()
+
+    def _resolve(self, name):
+        language = self._lookup(name)
+        if language:
+            return language.code
+        self._unknown_names.add(name)
+        self._logger.warning(f'Unknown language {name!r}, using {self._default_name}')
+        return self._lookup(self._default_name).code
+
+    def _lookup(self, name):
+        if self._indexes is None:
+            self._indexes = LanguageTable._build_indexes()
+        keys = (LanguageTable.normalize(name), LanguageTable.normalize(LanguageTable._simple_name(name)))
+        # Names before native names, as getlang_by_name is tried before getlang_by_native_name
+        return next((index[key] for index in self._indexes for key in keys if key in index), None)
+
+    @staticmethod
+    def _build_indexes():
+        # The same names as le_utils looks up, where a name shared by several languages
+        # is the last of them, and the names listed in a name or stripped of their
+        # variant come after every full name
+        names = {language.name: language for language in LANGUAGELIST}
+        native_names = {language.native_name: language for language in LANGUAGELIST}
+        name_index, native_name_index = {}, {}
+        for name, language in names.items():
+            name_index.setdefault(LanguageTable.normalize(name), language)
+        for name, language in native_names.items():
+            native_name_index.setdefault(LanguageTable.normalize(name), language)
+        for name, language in names.items():
+            if ';' in name:
+                aliases = name.split(';')
+            elif '(' in name or ',' in name:
+                aliases = [LanguageTable._simple_name(name)]
+            else:
+                aliases = []
+            for alias in aliases:
+                name_index.setdefault(LanguageTable.normalize(alias), language)
+        for name, language in native_names.items():
+            if '(' in name or ',' in name:
+                for alias in name.split(','):
+                    native_name_index.setdefault(LanguageTable.normalize(LanguageTable._simple_name(alias)), language)
+        # The site's spellings win over the languages le_utils knows by the same name
+        for alias, name in LanguageTable.ALIASES.items():
+            key = LanguageTable.normalize(name)
+            name_index[alias] = name_index.get(key) or native_name_index[key]
+        return name_index, native_name_index
+#endregion Languages
 
 #region Nalibali Chef
 class NalibaliChef(JsonTreeChef):
@@ -74,9 +1611,26 @@ class NalibaliChef(JsonTreeChef):
     TREES_DATA_DIR = os.path.join(DATA_DIR, 'trees')
     CRAWLING_STAGE_OUTPUT = 'web_resource_tree.json'
     SCRAPING_STAGE_OUTPUT = 'ricecooker_json_tree.json'
+    SCRAPING_FUNCS = {
+        'Multilingual stories': '_scrape_multilingual_story',
+        'Audio stories': '_scrape_audio_story',
+        'Story cards': '_scrape_story_card',
+        'Story seeds': '_scrape_story_seed',
+        'Your stories': '_scrape_your_story',
+    }
+    SCRAPING_STAGE_JOURNAL = 'scraping_journal.jsonl'
+    SCRAPING_STAGE_ERRORS = 'scraping_errors.json'
+    SCRAPING_STAGE_UNKNOWN_LANGUAGES = 'scraping_unknown_languages.json'
+    CRAWLING_STAGE_VALIDATORS = 'web_resource_validators.json'
+    CRAWLING_STAGE_DIFF = 'web_resource_tree_diff.json'
+    CRAWLING_STAGE_ALIASES = 'web_resource_tree_aliases.json'
+    CRAWLING_STAGE_IDENTITIES = 'web_resource_tree_identities.json'
+    VERIFIED_MP3_URLS = 'verified_mp3_urls.json'
+    PARSE_MEMO = '.parsememo.sqlite'
     ZIP_FILES_TMP_DIR = os.path.join(DATA_DIR, 'zipfiles')
-    LICENSE = get_license(licenses.CC_BY_NC_ND, copyright_holder="Nal'ibali").as_dict()
-    ENGLISH_LANGUAGE_CODE = getlang_by_name('English').code
+    IMAGES_DIR = os.path.join(DATA_DIR, 'images')
+    MEDIA_DIR = os.path.join(DATA_DIR, 'media')
+    PREFETCHED_FILE_TYPES = (content_kinds.AUDIO, content_kinds.DOCUMENT)
     #endregion Constants
 
     #region Regexes
@@ -89,12 +1643,129 @@ class NalibaliChef(JsonTreeChef):
     RSS_FEED_RE = compile(r'/rss/chan')
     #endregion Regexes
 
+    #region Parse filters
+    # Only the parts of each page the crawl and scrape look at are parsed
+    REGION_CONTENT_ONLY = SoupStrainer('div', class_='region-content')
+    PAGINATION_ONLY = SoupStrainer('ul', class_='pagination')
+    VIEW_CONTENT_ONLY = SoupStrainer('div', class_='view-content')
+    VIEW_CONTENT_AND_PAGINATION_ONLY = SoupStrainer(['div', 'ul'], class_=['view-content', 'pagination'])
+    SECTION_MAIN_ONLY = SoupStrainer('section', id='section-main')
+    IONO_FM_ANCHORS_ONLY = SoupStrainer('a', href=IONO_FM_RE)
+    RSS_FEED_LINKS_ONLY = SoupStrainer('link', href=RSS_FEED_RE)
+    RSS_ITEMS_ONLY = SoupStrainer('item')
+    LINKS_AND_SECTIONS_ONLY = SoupStrainer(['link', 'section'])
+    #endregion Parse filters
+
     def __init__(self, html, logger):
         super(NalibaliChef, self).__init__(None, None)
         self._html = html
         self._logger = logger
+        self._crawl_workers = 1
+        self._previous_hierarchies = {}
+        self._partially_crawled_urls = set()
+        self._feed_validators = {}
+        self._head_workers = 8
+        self._http_config = None
+        self._http_cache = None
+        self._verified_mp3_urls = set()
+        self._languages = LanguageTable(logger)
+        self._dedup_stories = False
+        self._story_aliases = {}
+        self._previous_story_aliases = {}
+        self._previous_alias_urls = set()
+        self._story_identities = {}
+        self._previous_story_identities = {}
+        self._selected_hierarchies = None
+        self._selected_languages = None
+        self._unselected_hierarchies = {}
+        self._unselected_topics = {}
+        self._scrape_executor = None
+        self._image_store = ImageStore(html, NalibaliChef.IMAGES_DIR)
+        self._image_optimizer = None
+        self._image_executor = None
+        self._zip_manifest = None
+        self._zip_store_media = False
+        self._scrape_journal = None
+        self._media_store = None
+        self._prefetch_executor = None
+        self._scrape_errors = []
+        self.arg_parser.add_argument('--crawl-workers', type=int, default=1,
+            help='Number of hierarchies and pagination pages fetched concurrently during the crawl.')
+        self.arg_parser.add_argument('--max-connections-per-host', type=int, default=4,
+            help='Maximum number of concurrent requests sent to the same host.')
+        self.arg_parser.add_argument('--requests-per-second', type=float,
+            help='Starting rate of requests sent to each host by each process, adapted down when the host throttles. Unlimited by default.')
+        self.arg_parser.add_argument('--http-retries', type=int, default=3,
+            help='Number of times a request is sent again after a connection error, a 429 or a 5xx response.')
+        self.arg_parser.add_argument('--head-workers', type=int, default=8,
+            help='Number of concurrent requests used to check that the mp3 version of an audio story exists.')
+        self.arg_parser.add_argument('--http-archive',
+            help='Path of the HTTP archive used by --http-archive-mode.')
+        self.arg_parser.add_argument('--http-archive-mode', choices=['record', 'replay'],
+            help='Record every response of the run into the HTTP archive, or serve every request from it.')
+        self.arg_parser.add_argument('--http-cache', choices=['file', 'tiered'], default='file',
+            help='Cache HTTP responses in one file per response in .webcache, or in memory in front of .webcache.sqlite.')
+        self.arg_parser.add_argument('--http-cache-memory-mb', type=int, default=64,
+            help='Size of the in-memory tier of --http-cache=tiered, per process.')
+        self.arg_parser.add_argument('--http-cache-max-mb', type=int,
+            help='Size past which the least recently used responses are evicted from .webcache.sqlite.')
+        self.arg_parser.add_argument('--metrics-file',
+            help='JSON file the metrics of the run are written to at the end of pre_run, or on SIGUSR1.')
+        self.arg_parser.add_argument('--html-parser', choices=['html.parser', 'lxml'], default='html.parser',
+            help='BeautifulSoup backend used to parse pages.')
+        self.arg_parser.add_argument('--parse-memo', action='store_true',
+            help='Reuse the pagination entries, story rows and RSS items extracted from pages that did not change since the last crawl.')
+        self.arg_parser.add_argument('--parse-memo-max-entries', type=int, default=50000,
+            help='Number of pages past which the least recently used entries of the parse memo are evicted.')
+        self.arg_parser.add_argument('--invalidate-parse-memo', action='store_true',
+            help='Empty the parse memo before crawling, after changing how the crawl reads pages.')
+        self.arg_parser.add_argument('--incremental', action='store_true',
+            help='Merge new stories into the previous web_resource_tree.json instead of crawling every page.')
+        self.arg_parser.add_argument('--dedup-stories', action='store_true',
+            help='Drop the stories whose page has the same canonical link, short link or content as another story of their hierarchy.')
+        self.arg_parser.add_argument('--reuse-zips', action='store_true',
+            help='Reuse the HTML5 zip of a story when its HTML and images did not change since the last run.')
+        self.arg_parser.add_argument('--zip-store-media', action='store_true',
+            help='Store the images of HTML5 zips without compressing them again. Faster, but the zips differ from those of create_predictable_zip.')
+        self.arg_parser.add_argument('--scrape-workers', type=int, default=1,
+            help='Number of worker processes used to scrape stories.')
+        self.arg_parser.add_argument('--optimize-images', action='store_true',
+            help='Downscale and recompress the images of HTML5 stories before they are zipped.')
+        self.arg_parser.add_argument('--image-max-dimension', type=int, default=1024,
+            help='Maximum width and height in pixels of the images optimized by --optimize-images.')
+        self.arg_parser.add_argument('--image-quality', type=int, default=75,
+            help='JPEG quality of the images optimized by --optimize-images.')
+        self.arg_parser.add_argument('--image-workers', type=int, default=os.cpu_count(),
+            help='Number of images of a story downloaded and optimized concurrently, in each scraping process.')
+        self.arg_parser.add_argument('--resume-scrape', action='store_true',
+            help='Skip the stories a previous scrape finished, as recorded in the scraping journal.')
+        self.arg_parser.add_argument('--prefetch-media', action='store_true',
+            help='Download the audio and PDF files during the scrape, and point their nodes to the local files.')
+        self.arg_parser.add_argument('--prefetch-workers', type=int, default=8,
+            help='Number of audio and PDF files downloaded concurrently by --prefetch-media.')
+        self.arg_parser.add_argument('--only-stage', choices=['crawl', 'scrape'],
+            help='Only crawl, then exit without scraping nor uploading, or only scrape the previous crawling output.')
+        self.arg_parser.add_argument('--hierarchies',
+            help='Comma-separated titles of the hierarchies to crawl and scrape. The others are kept from the previous run.')
+        self.arg_parser.add_argument('--languages',
+            help='Comma-separated languages to crawl and scrape. The others are kept from the previous run.')
 
     #region Helper functions
+    def _configure_selection(self, args):
+        self._selected_hierarchies = self.__parse_selection(args.get('hierarchies'))
+        self._selected_languages = self.__parse_selection(args.get('languages'))
+
+    def __parse_selection(self, value):
+        if not value:
+            return None
+        return set(name.strip().lower() for name in value.split(',') if name.strip())
+
+    def _is_selected(self, name, selection):
+        return selection is None or name.lower() in selection
+
+    def _has_selection(self):
+        return self._selected_hierarchies is not None or self._selected_languages is not None
+
     def __absolute_url(self, url):
         if url.startswith("//"):
             return "https:" + url
@@ -112,57 +1783,226 @@ class NalibaliChef(JsonTreeChef):
         return new_text.strip()
 
     def __process_language(self, language):
-        lang = language.lower()
-        if lang == 'sotho':
-            return 'Sesotho'
-        elif lang == 'ndebele':
-            return 'North Ndebele'
-        elif lang == 'tsivenda':
-            return 'Tshivenda'
-        elif lang == 'seswati':
-            return 'Siswati'
-        elif lang == 'tsw':
-            return 'Setswana'
-        elif lang == 'continue reading':
-            return 'English'
-        return language
+        return self._languages.name(language)
 
     def __get_language_code(self, language_str):
-        language = getlang_by_name(language_str) or getlang_by_native_name(language_str)
-        if language:
-            return language.code
-        else:
-            print('Unknown language:', language_str)
-            return NalibaliChef.ENGLISH_LANGUAGE_CODE
+        return self._languages.code(language_str)
+
+    # Computed on first use rather than when the class is defined, so that runs that
+    # never build nodes do not pay for them
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _license():
+        return get_license(licenses.CC_BY_NC_ND, copyright_holder="Nal'ibali").as_dict()
+
+    def _configure_http(self, kwargs):
+        http_archive = (kwargs.get('http_archive'), kwargs.get('http_archive_mode'))
+        if not all(http_archive):
+            http_archive = (None, None)
+        # Requests missing from a replayed archive fail the same way every time
+        self._html.set_max_retries(0 if http_archive[1] == 'replay' else kwargs.get('http_retries', 3))
+        self._html.limit_request_rate(kwargs.get('requests_per_second'))
+        http_cache = ('file',)
+        if kwargs.get('http_cache') == 'tiered':
+            http_cache = ('tiered', kwargs.get('http_cache_memory_mb'), kwargs.get('http_cache_max_mb'))
+        # A connection for every thread that may send requests to the same host at once,
+        # up to the number of concurrent requests allowed per host
+        pool_maxsize = max(kwargs.get('crawl_workers') or 1, kwargs.get('head_workers') or 8,
+            (kwargs.get('prefetch_workers') or 8 if kwargs.get('prefetch_media') else 0)
+            + (kwargs.get('image_workers') or 1 if kwargs.get('optimize_images') else 1))
+        if kwargs.get('max_connections_per_host'):
+            pool_maxsize = min(pool_maxsize, kwargs['max_connections_per_host'])
+        http_config = (*http_archive, http_cache, pool_maxsize)
+        if http_config == self._http_config:
+            return
+        self._http_config = http_config
+        self._http_cache = create_http_cache(*http_cache)
+        self._html.set_http_session(create_http_session(NalibaliChef.HOSTNAME, *http_archive, cache=self._http_cache, pool_maxsize=pool_maxsize))
+
+    def _crawl_map(self, func, iterable):
+        return list(self._crawl_imap(func, iterable))
+
+    def _crawl_imap(self, func, iterable):
+        # executor.map yields results in submission order, so the crawl output is
+        # the same regardless of how many workers are used
+        if self._crawl_workers <= 1:
+            yield from map(func, iterable)
+            return
+        with ThreadPoolExecutor(max_workers=self._crawl_workers) as executor:
+            yield from executor.map(func, iterable)
 
     #endregion Helper functions
 
     #region Crawling
     def crawl(self, args, options):
-        root_page = self._html.get(NalibaliChef.ROOT_URL)
-        story_hierarchies = self._crawl_story_hierarchies(root_page)
+        self._configure_http(args)
+        self._crawl_workers = max(1, args.get('crawl_workers') or 1)
+        self._html.limit_connections_per_host(args.get('max_connections_per_host'))
+        self._head_workers = max(1, args.get('head_workers') or 1)
+        self._html.set_parser(args.get('html_parser') or 'html.parser')
+        self._configure_parse_memo(args)
+        self._configure_selection(args)
+        self._dedup_stories = args.get('dedup_stories', False)
+        self._story_aliases = {}
+        self._story_identities = {}
+        identities_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_IDENTITIES)
+        if self._dedup_stories and os.path.exists(identities_file_name):
+            with open(identities_file_name, 'r') as json_file:
+                self._previous_story_identities = json.load(json_file)
+        verified_mp3_urls_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.VERIFIED_MP3_URLS)
+        if os.path.exists(verified_mp3_urls_file_name):
+            with open(verified_mp3_urls_file_name, 'r') as json_file:
+                self._verified_mp3_urls = set(json.load(json_file))
+        incremental = args.get('incremental', False)
+        if incremental:
+            self._load_previous_crawl()
+        if self._has_selection():
+            self._load_unselected_hierarchies()
+        crawl_diff = {}
+        story_hierarchies = self._crawl_story_hierarchies()
+        if incremental:
+            story_hierarchies = self._crawl_diff_story_hierarchies(story_hierarchies, crawl_diff)
+        # Each hierarchy is written out as soon as it has been crawled
         web_resource_tree = dict(
             kind='NalibaliWebResourceTree',
             title="Nal'ibali Web Resource Tree",
             language='en',
-            children=story_hierarchies,
+            children=StreamedList(story_hierarchies),
         )
         json_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_OUTPUT)
-        with open(json_file_name, 'w') as json_file:
-            json.dump(web_resource_tree, json_file, indent=2)
-            self._logger.info('Crawling results stored in ' + json_file_name)
-        return story_hierarchies
+        write_json_stream(json_file_name, web_resource_tree)
+        self._logger.info('Crawling results stored in ' + json_file_name)
+        # Read back by the next crawl, so a crawl killed while writing must not truncate them
+        with atomic_write(os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_VALIDATORS)) as json_file:
+            json.dump(self._feed_validators, json_file, indent=2)
+        with atomic_write(verified_mp3_urls_file_name) as json_file:
+            json.dump(sorted(self._verified_mp3_urls), json_file, indent=2)
+        if self._dedup_stories:
+            self._write_story_aliases()
+        if incremental:
+            diff_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_DIFF)
+            with atomic_write(diff_file_name) as json_file:
+                json.dump(crawl_diff, json_file, indent=2)
+            self._logger.info('Crawling diff stored in ' + diff_file_name)
+        return json_file_name
+
+    def _write_story_aliases(self):
+        aliases_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_ALIASES)
+        if self._has_selection() and os.path.exists(aliases_file_name):
+            # The aliases of the hierarchies that were not crawled again still hold
+            with open(aliases_file_name, 'r') as json_file:
+                self._story_aliases = dict(json.load(json_file), **self._story_aliases)
+            self._story_identities = dict(self._previous_story_identities, **self._story_identities)
+        # Both are read back by the next --dedup-stories crawl
+        with atomic_write(aliases_file_name) as json_file:
+            json.dump(self._story_aliases, json_file, indent=2, sort_keys=True)
+        with atomic_write(os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_IDENTITIES)) as json_file:
+            json.dump(self._story_identities, json_file, indent=2, sort_keys=True)
+        aliases_count = sum(len(aliases) for aliases in self._story_aliases.values())
+        pages_fetched = METRICS.snapshot()['counters'].get('dedup.pages_fetched', 0)
+        self._logger.info(f'{aliases_count} aliased stories dropped, saving {aliases_count} story page fetches and zips in the scrape, '
+            f'for {pages_fetched} story pages fetched by the crawl to identify the stories')
+
+    def _configure_parse_memo(self, args):
+        use_parse_memo = args.get('parse_memo')
+        if not use_parse_memo and not (args.get('invalidate_parse_memo') and os.path.exists(NalibaliChef.PARSE_MEMO)):
+            self._html.set_parse_memo(None)
+            return
+        parse_memo = ParseMemo(NalibaliChef.PARSE_MEMO, args.get('parse_memo_max_entries'))
+        if args.get('invalidate_parse_memo'):
+            parse_memo.invalidate()
+            self._logger.info('Parse memo invalidated')
+        self._html.set_parse_memo(parse_memo if use_parse_memo else None)
 
-    def _crawl_story_hierarchies(self, page):
+    def _load_previous_crawl(self):
+        json_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_OUTPUT)
+        if not os.path.exists(json_file_name):
+            self._logger.info('No previous crawl found, crawling everything')
+            return
+        with open(json_file_name, 'r') as json_file:
+            web_resource_tree = json.load(json_file)
+            assert web_resource_tree['kind'] == 'NalibaliWebResourceTree'
+        self._previous_hierarchies = { h['url']: h.get('children', {}) for h in web_resource_tree['children'] }
+        aliases_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_ALIASES)
+        if os.path.exists(aliases_file_name):
+            # Dropped aliases are not new stories when they show up again
+            with open(aliases_file_name, 'r') as json_file:
+                self._previous_story_aliases = json.load(json_file)
+            self._previous_alias_urls = set(alias['url'] for aliases in self._previous_story_aliases.values() for alias in aliases)
+        validators_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_VALIDATORS)
+        if os.path.exists(validators_file_name):
+            with open(validators_file_name, 'r') as json_file:
+                self._feed_validators = json.load(json_file)
+
+    def _load_unselected_hierarchies(self):
+        self._unselected_hierarchies = {}
+        json_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_OUTPUT)
+        if not os.path.exists(json_file_name):
+            self._logger.warning('No previous crawl found, the hierarchies and languages not selected are left out')
+            return
+        with open(json_file_name, 'r') as json_file:
+            web_resource_tree = json.load(json_file)
+            assert web_resource_tree['kind'] == 'NalibaliWebResourceTree'
+        self._unselected_hierarchies = { h['title']: h for h in web_resource_tree['children'] }
+
+    def _merge_unselected_languages(self, stories_by_language, previous_stories_by_language):
+        """
+        Returns the stories of the selected languages, and the previous stories of the
+        other languages. Languages keep their previous order, and new languages come last.
+        """
+        if self._selected_languages is None:
+            return stories_by_language
+        merged = {}
+        for lang, stories in previous_stories_by_language.items():
+            if not self._is_selected(lang, self._selected_languages):
+                merged[lang] = stories
+            elif lang in stories_by_language:
+                merged[lang] = stories_by_language[lang]
+        for lang, stories in stories_by_language.items():
+            if lang not in merged and self._is_selected(lang, self._selected_languages):
+                merged[lang] = stories
+        return merged
+
+    def _crawl_diff_story_hierarchies(self, story_hierarchies, diff):
+        for h in story_hierarchies:
+            previous_urls = set(story['url'] for stories in self._previous_hierarchies.get(h['url'], {}).values() for story in stories)
+            urls = [story['url'] for stories in h['children'].values() for story in stories]
+            added = [url for url in urls if url not in previous_urls]
+            if h['url'] in self._partially_crawled_urls:
+                # Only the first pages were walked and the previous stories kept, so the
+                # stories taken off the site are only found by a full crawl
+                diff[h['title']] = dict(added=added)
+                self._logger.info(f"{h['title']}: {len(added)} stories added, removed stories are only found by a full crawl")
+                yield h
+                continue
+            removed = sorted(previous_urls.difference(urls))
+            diff[h['title']] = dict(added=added, removed=removed)
+            self._logger.info(f"{h['title']}: {len(added)} stories added, {len(removed)} stories removed")
+            yield h
+
+    def _crawl_story_hierarchies(self):
+        story_hierarchies = self._html.get_extracted(NalibaliChef.ROOT_URL, self._crawl_to_story_hierarchies,
+            parse_only=NalibaliChef.REGION_CONTENT_ONLY)
+        selected_hierarchies = [h for h in story_hierarchies if self._is_selected(h['title'], self._selected_hierarchies)]
+        if self._selected_hierarchies is not None and len(selected_hierarchies) < len(self._selected_hierarchies):
+            titles = ', '.join(h['title'] for h in story_hierarchies)
+            self._logger.warning(f'Some of the selected hierarchies do not exist, the hierarchies are: {titles}')
+        crawled_hierarchies = self._crawl_imap(self._crawl_story_hierarchy, selected_hierarchies)
+        for h in story_hierarchies:
+            previous_hierarchy = self._unselected_hierarchies.get(h['title'])
+            if not self._is_selected(h['title'], self._selected_hierarchies):
+                if previous_hierarchy:
+                    yield previous_hierarchy
+                continue
+            stories_url, stories = next(crawled_hierarchies)
+            h['children'] = self._merge_unselected_languages(stories, (previous_hierarchy or {}).get('children', {}))
+            yield h
+
+    def _crawl_to_story_hierarchies(self, page):
         content_div = page.find('div', class_='region-content')
         vocabulary_div = content_div.find('div', class_='view-vocabulary')
         stories_divs = vocabulary_div.find_all('div', 'views-row')
-        story_hierarchies = [h for h in map(self._crawl_to_story_hierarchy, stories_divs)]
-        stories_dict = dict(map(self._crawl_story_hierarchy, story_hierarchies))
-        for h in story_hierarchies:
-            stories = stories_dict.get(h['url'], {})
-            h['children'] = stories
-        return story_hierarchies
+        return [h for h in map(self._crawl_to_story_hierarchy, stories_divs)]
 
     def _crawl_to_story_hierarchy(self, div):
         title = self.__get_text(div.find('h2'))
@@ -178,10 +2018,27 @@ class NalibaliChef(JsonTreeChef):
         )
 
     def _crawl_story_hierarchy(self, hierarchy):
+        with METRICS.timer(f"crawl.hierarchy.{hierarchy['title']}"):
+            return self._crawl_story_hierarchy_helper(hierarchy)
+
+    def _crawl_story_hierarchy_helper(self, hierarchy):
         if NalibaliChef.AUDIO_STORIES_RE.search(hierarchy['title']):
             return self._crawl_audio_stories_hierarchy(hierarchy)
 
+        stories_url, stories_by_language = self._crawl_pagination_hierarchy(hierarchy)
+        if self._dedup_stories:
+            stories_by_language = self._crawl_drop_aliases(hierarchy, stories_by_language)
+        return stories_url, stories_by_language
+
+    def _crawl_pagination_hierarchy(self, hierarchy):
         stories_url = hierarchy['url']
+        previous_stories = self._previous_hierarchies.get(stories_url)
+        if previous_stories is not None:
+            self._partially_crawled_urls.add(stories_url)
+            all_stories_by_bucket = self._crawl_new_pagination_stories(stories_url, previous_stories)
+            stories_by_language = self._group_stories_by_language(all_stories_by_bucket)
+            return stories_url, self._merge_stories_by_language(stories_by_language, previous_stories)
+
         paginations = self._crawl_pagination(stories_url)
         paginations.insert(0, dict(
                 kind='NalibaliPagination',
@@ -189,7 +2046,69 @@ class NalibaliChef(JsonTreeChef):
                 page=0,
                 name='1',
             ))
-        all_stories_by_bucket = list(map(self._crawl_pagination_stories, paginations))
+        all_stories_by_bucket = self._crawl_map(self._crawl_pagination_stories, paginations)
+        return stories_url, self._group_stories_by_language(all_stories_by_bucket)
+
+    def _crawl_drop_aliases(self, hierarchy, stories_by_language):
+        hierarchy_title = hierarchy['title']
+        # Documents are not pages, so only the stories scraped as HTML5 apps are compared
+        stories = [(lang, story) for lang, stories in stories_by_language.items() for story in stories if not story['url'].endswith('.pdf')]
+        urls = [story['url'] for lang, story in stories]
+        # The stories an incremental crawl kept from the previous crawl keep their identity,
+        # and only the pages of the new stories are fetched
+        partially_crawled = hierarchy['url'] in self._partially_crawled_urls
+        known_identities = self._previous_story_identities if partially_crawled else {}
+        new_urls = [url for url in urls if url not in known_identities]
+        fetched_identities = dict(zip(new_urls, self._crawl_map(self._crawl_story_identity_at, new_urls)))
+        METRICS.increment('dedup.pages_fetched', len(new_urls))
+        identities = [fetched_identities[url] if url in fetched_identities else known_identities[url] for url in urls]
+        self._story_identities.update(zip(urls, identities))
+        story_index = StoryIndex()
+        aliases = []
+        for (lang, story), identity in zip(stories, identities):
+            primary_url = story_index.add(story['url'], identity)
+            if primary_url:
+                aliases.append(dict(language=lang, url=story['url'], alias_of=primary_url))
+        METRICS.increment('dedup.aliases', len(aliases))
+        # The aliases on the pages an incremental crawl did not walk again are still left out
+        kept_aliases = []
+        if partially_crawled:
+            crawled_urls = set(urls)
+            kept_aliases = [alias for alias in self._previous_story_aliases.get(hierarchy_title, []) if alias['url'] not in crawled_urls]
+        self._story_aliases[hierarchy_title] = aliases + kept_aliases
+        if not aliases:
+            return stories_by_language
+        self._logger.info(f'{hierarchy_title}: {len(aliases)} aliased stories dropped')
+        aliases_by_language = {}
+        for alias in aliases:
+            aliases_by_language.setdefault(alias['language'], set()).add(alias['url'])
+        deduped = {}
+        for lang, stories in stories_by_language.items():
+            alias_urls = aliases_by_language.get(lang, set())
+            stories = [story for story in stories if story['url'] not in alias_urls]
+            if stories:
+                deduped[lang] = stories
+        return deduped
+
+    def _crawl_story_identity_at(self, url):
+        return self._html.get_extracted(url, self._crawl_story_identity, parse_only=NalibaliChef.LINKS_AND_SECTIONS_ONLY)
+
+    def _crawl_story_identity(self, page):
+        links = {}
+        for link in page.find_all('link', href=True):
+            for rel in link.get('rel') or []:
+                links.setdefault(rel, self.__absolute_url(link['href']))
+        content_hash = None
+        story_section = page.find('section', id='section-main')
+        if story_section:
+            # Left out of the zips as well, and different for every translation
+            links_section = story_section.find('div', class_='languages-links')
+            if links_section:
+                links_section.extract()
+            content_hash = hashlib.sha256(str(story_section).encode('utf-8')).hexdigest()
+        return dict(canonical=links.get('canonical'), shortlink=links.get('shortlink'), content_hash=content_hash)
+
+    def _group_stories_by_language(self, all_stories_by_bucket):
         stories_by_language = {}
         for stories_bucket in all_stories_by_bucket:
             for story in stories_bucket:
@@ -205,17 +2124,48 @@ class NalibaliChef(JsonTreeChef):
                     uniques.add(url)
         for lang, (uniques, stories) in stories_by_language.items():
             stories_by_language[lang] = stories
-        return stories_url, stories_by_language
+        return stories_by_language
+
+    def _crawl_new_pagination_stories(self, stories_url, previous_stories):
+        # New stories only ever show up on the first pages, so stop as soon as a
+        # page has nothing that was not already crawled
+        known_urls = set(story['url'] for stories in previous_stories.values() for story in stories)
+        known_urls.update(self._previous_alias_urls)
+        all_stories_by_bucket = []
+        pagination = dict(
+            kind='NalibaliPagination',
+            url=stories_url,
+            page=0,
+            name='1',
+        )
+        while pagination:
+            stories, next_pagination = self._html.get_extracted(pagination['url'], self._crawl_page_stories_and_next_pagination,
+                parse_only=NalibaliChef.VIEW_CONTENT_AND_PAGINATION_ONLY)
+            all_stories_by_bucket.append(stories)
+            urls = set(s['url'] for story in stories for s in story['supported_languages'].values())
+            if urls.issubset(known_urls):
+                break
+            pagination = next_pagination
+        return all_stories_by_bucket
+
+    def _crawl_page_stories_and_next_pagination(self, page):
+        return self._crawl_page_stories(page), self._crawl_next_pagination(page)
+
+    def _merge_stories_by_language(self, stories_by_language, previous_stories):
+        languages = list(previous_stories) + [lang for lang in stories_by_language if lang not in previous_stories]
+        merged = {}
+        for lang in languages:
+            stories = stories_by_language.get(lang, [])
+            urls = set(story['url'] for story in stories)
+            merged[lang] = stories + [story for story in previous_stories.get(lang, []) if story['url'] not in urls]
+        return merged
 
     def _crawl_pagination(self, url):
-        page = self._html.get(url)
-        pagination_ul = page.find('ul', class_='pagination')
+        paginations = self._html.get_extracted(url, self._crawl_paginations, parse_only=NalibaliChef.PAGINATION_ONLY)
 
-        if not pagination_ul:
+        if paginations is None:
             return []
 
-        anchors = pagination_ul.find_all('a', attrs={'href': NalibaliChef.STORY_PAGE_LINK_RE})
-        paginations = list(map(self._crawl_to_pagination, anchors))
         paginations_dict = {p['name']: p for p in paginations}
         actual_paginations = [p for p in paginations if ('next' not in p['name']  and 'last' not in p['name'] and 'first' not in p['name'] and 'previous' not in p['name'] and '>' not in p['name'] and '‹' not in p['name'] and p['name'] != '')]
         last = paginations_dict.get('last')
@@ -233,6 +2183,20 @@ class NalibaliChef(JsonTreeChef):
                 if x['page'] not in seen and not seen.add(x['page'])
             ]
 
+    def _crawl_paginations(self, page):
+        pagination_ul = page.find('ul', class_='pagination')
+        if not pagination_ul:
+            return None
+        anchors = pagination_ul.find_all('a', attrs={'href': NalibaliChef.STORY_PAGE_LINK_RE})
+        return list(map(self._crawl_to_pagination, anchors))
+
+    def _crawl_next_pagination(self, page):
+        pagination_ul = page.find('ul', class_='pagination')
+        if not pagination_ul:
+            return None
+        anchors = pagination_ul.find_all('a', attrs={'href': NalibaliChef.STORY_PAGE_LINK_RE})
+        return next((p for p in map(self._crawl_to_pagination, anchors) if 'next' in p['name']), None)
+
     def _crawl_to_pagination(self, anchor):
         href = anchor['href']
         m = NalibaliChef.STORY_PAGE_LINK_RE.match(href)
@@ -251,7 +2215,9 @@ class NalibaliChef(JsonTreeChef):
 
     def _crawl_pagination_stories(self, pagination):
         url = pagination['url']
-        page = self._html.get(url)
+        return self._html.get_extracted(url, self._crawl_page_stories, parse_only=NalibaliChef.VIEW_CONTENT_ONLY)
+
+    def _crawl_page_stories(self, page):
         content_views = page.find_all('div', class_='view-content')
         stories = []
         for content in content_views:
@@ -304,46 +2270,98 @@ class NalibaliChef(JsonTreeChef):
 
     def _crawl_audio_stories_hierarchy(self, hierarchy):
         stories_url = hierarchy['url']
-        page  = self._html.get(stories_url)
-        content = page.find('section', id='section-main').find('div', class_='region-content')
-        language_info = [(self.__process_language(self.__get_text(anchor)), anchor['href']) for anchor in content.find_all('a', attrs={'href': NalibaliChef.AUDIO_STORY_ANCHOR_RE}) if not anchor.get('class') and len(self.__get_text(anchor)) > 2]
+        language_info = self._html.get_extracted(stories_url, self._crawl_audio_languages, parse_only=NalibaliChef.SECTION_MAIN_ONLY)
         stories_by_language = {}
+        previous_stories = self._previous_hierarchies.get(stories_url, {})
 
         for lang, url in language_info:
-            language_page = self._html.get(self.__absolute_url(url))
-            language_iono_fm_url = language_page.find('a', attrs={'href': NalibaliChef.IONO_FM_RE })['href']
-            language_iono_fm_page = self._html.get(language_iono_fm_url)
-            rss_url = language_iono_fm_page.find('link', attrs={'href': NalibaliChef.RSS_FEED_RE })['href']
-            rss_page = self._html.get_xml(rss_url)
-            items = rss_page.find_all('item')
+            if not self._is_selected(lang, self._selected_languages):
+                continue
+            language_url = self.__absolute_url(url)
+            feed = self._feed_validators.get(language_url)
+            if not feed or lang not in previous_stories:
+                language_iono_fm_url = self._html.get_extracted(language_url, self._crawl_iono_fm_url,
+                    parse_only=NalibaliChef.IONO_FM_ANCHORS_ONLY)
+                feed = dict(rss_url=self._html.get_extracted(language_iono_fm_url, self._crawl_rss_feed_url,
+                    parse_only=NalibaliChef.RSS_FEED_LINKS_ONLY))
+            rss_url = feed['rss_url']
+            items, etag, last_modified = self._html.get_xml_if_modified(rss_url, feed.get('etag'), feed.get('last_modified'),
+                parse_only=NalibaliChef.RSS_ITEMS_ONLY, extract=self._crawl_rss_items)
+            self._feed_validators[language_url] = dict(rss_url=rss_url, etag=etag, last_modified=last_modified)
+            if items is None:
+                self._logger.info(f'RSS feed not modified, reusing previous {lang} audio stories')
+                stories_by_language[lang] = previous_stories[lang]
+                continue
             stories = [None] * len(items)
+            urls = [item['url'] for item in items]
+            mp3_urls = list(map(self._crawl_to_mp3_url, urls))
+            mp3_versions_exist = self._crawl_mp3_versions_exist(mp3_urls)
 
             for i, item in enumerate(items):
-                url = item.enclosure['url'].split('?')[0]
-                filename = os.path.basename(url)
-                filename_posix = PurePosixPath(filename)
-                filename_no_extension = filename_posix.stem
-                mp3_url = os.path.join(os.path.dirname(url), filename_no_extension) + '.mp3'
-                mp3_version_exists = self._html.head(mp3_url).status_code == 200
+                url = urls[i]
+                mp3_url = mp3_urls[i]
+                mp3_version_exists = mp3_versions_exist[i]
                 if not mp3_version_exists:
                     raise Exception(f'No mp3 version available for {url}')
                 audio_node_url = mp3_url if mp3_version_exists else url
                 parsed_url = urlparse(audio_node_url)
 
                 stories[i] = dict(
-                    title=self.__get_text(item.title),
+                    title=item['title'],
                     source_id=parsed_url.path,
                     url=audio_node_url,
-                    content_type=item.enclosure['type'],
-                    description=self.__get_text(item.summary),
-                    pub_date=self.__get_text(item.pubDate),
-                    author=self.__get_text(item.author),
+                    content_type=item['content_type'],
+                    description=item['description'],
+                    pub_date=item['pub_date'],
+                    author=item['author'],
                     language=lang,
-                    thumbnail=item.thumbnail['href'],
+                    thumbnail=item['thumbnail'],
                 )
             stories_by_language[lang] = stories
         return stories_url, stories_by_language
 
+    def _crawl_audio_languages(self, page):
+        content = page.find('section', id='section-main').find('div', class_='region-content')
+        return [(self.__process_language(self.__get_text(anchor)), anchor['href']) for anchor in content.find_all('a', attrs={'href': NalibaliChef.AUDIO_STORY_ANCHOR_RE}) if not anchor.get('class') and len(self.__get_text(anchor)) > 2]
+
+    def _crawl_iono_fm_url(self, page):
+        return page.find('a', attrs={'href': NalibaliChef.IONO_FM_RE })['href']
+
+    def _crawl_rss_feed_url(self, page):
+        return page.find('link', attrs={'href': NalibaliChef.RSS_FEED_RE })['href']
+
+    def _crawl_rss_items(self, rss_page):
+        return [
+            dict(
+                title=self.__get_text(item.title),
+                url=item.enclosure['url'].split('?')[0],
+                content_type=item.enclosure['type'],
+                description=self.__get_text(item.summary),
+                pub_date=self.__get_text(item.pubDate),
+                author=self.__get_text(item.author),
+                thumbnail=item.thumbnail['href'],
+            )
+            for item in rss_page.find_all('item')
+        ]
+
+    def _crawl_to_mp3_url(self, url):
+        filename = os.path.basename(url)
+        filename_posix = PurePosixPath(filename)
+        filename_no_extension = filename_posix.stem
+        return os.path.join(os.path.dirname(url), filename_no_extension) + '.mp3'
+
+    def _crawl_mp3_versions_exist(self, mp3_urls):
+        # mp3 versions verified by previous runs are not probed again
+        unverified_urls = [url for url in mp3_urls if url not in self._verified_mp3_urls]
+        with ThreadPoolExecutor(max_workers=self._head_workers) as executor:
+            exist = list(executor.map(self._crawl_mp3_version_exists, unverified_urls))
+        self._verified_mp3_urls.update(url for url, url_exists in zip(unverified_urls, exist) if url_exists)
+        return [url in self._verified_mp3_urls for url in mp3_urls]
+
+    def _crawl_mp3_version_exists(self, mp3_url):
+        # Connection errors, 429 and 5xx responses are retried by Html
+        return self._html.head(mp3_url).status_code == 200
+
     #endregion Crawling
 
     #region Scraping
@@ -351,56 +2369,267 @@ class NalibaliChef(JsonTreeChef):
         kwargs = {}     # combined dictionary of argparse args and extra options
         kwargs.update(args)
         kwargs.update(options)
-
-        with open(os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_OUTPUT), 'r') as json_file:
-            web_resource_tree = json.load(json_file)
-            assert web_resource_tree['kind'] == 'NalibaliWebResourceTree'
-
-        ricecooker_json_tree = dict(
-            source_domain=NalibaliChef.HOSTNAME,
-            source_id="nal'ibali",
-            title=web_resource_tree['title'],
-            description="""Nal'ibali (isiXhosa for "here's the story") is a national reading-for-enjoyment campaign to spark children's potential through storytelling and reading.""",
-            language='en',
-            thumbnail='http://nalibali.org/sites/default/files/nalibali_logo.png',
-            children=[],
-        )
-        hierarchies_map = { h['title']: h for h in web_resource_tree['children'] }
-        children = [None] * len(hierarchies_map.keys())
-        children[0] = self._scrape_hierarchy(hierarchies_map.get('Multilingual stories'), self._scrape_multilingual_story)
-        children[1] = self._scrape_hierarchy(hierarchies_map.get('Audio stories'), self._scrape_audio_story)
-        children[2] = self._scrape_hierarchy(hierarchies_map.get('Story cards'), self._scrape_story_card)
-        children[3] = self._scrape_hierarchy(hierarchies_map.get('Story seeds'), self._scrape_story_seed)
-        children[4] = self._scrape_hierarchy(hierarchies_map.get('Your stories'), self._scrape_your_story)
-        ricecooker_json_tree['children'] = children
-        write_tree_to_json_tree(os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.SCRAPING_STAGE_OUTPUT) , ricecooker_json_tree)
-        return ricecooker_json_tree
+        kwargs.setdefault('scrape_started', time.time())
+        self._configure_scrape(kwargs)
+        self._configure_selection(kwargs)
+        crawling_output = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.CRAWLING_STAGE_OUTPUT)
+        if not os.path.exists(crawling_output):
+            raise Exception(f'No crawling output in {crawling_output}, the crawl has to run before the scrape')
+
+        self._remove_zip_leftovers()
+        scrape_workers = kwargs.get('scrape_workers') or 1
+        if scrape_workers > 1:
+            # Only loaded when stories are scraped by worker processes
+            from concurrent.futures import ProcessPoolExecutor
+            self._scrape_executor = ProcessPoolExecutor(max_workers=scrape_workers, initializer=_init_scrape_worker, initargs=(kwargs,))
+        if kwargs.get('prefetch_media'):
+            self._media_store = MediaStore(self._html, NalibaliChef.MEDIA_DIR)
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=max(1, kwargs.get('prefetch_workers') or 8))
+        json_tree_path = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.SCRAPING_STAGE_OUTPUT)
+        if self._has_selection():
+            self._load_unselected_topics(json_tree_path)
+        self._scrape_journal = ScrapeJournal(os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.SCRAPING_STAGE_JOURNAL),
+            resume=kwargs.get('resume_scrape'))
+        self._scrape_errors = []
+        # Separate from ricecooker's --resume, which would also restore the tree of the
+        # last upload session in place of the one scraped here
+        if kwargs.get('resume_scrape'):
+            self._logger.info(f'Resuming scrape, {len(self._scrape_journal)} stories already scraped')
+        # The crawling output is read one story at a time, and topic nodes are written
+        # out as their stories are scraped
+        try:
+            with open(crawling_output, 'r') as json_file:
+                reader = JsonStreamReader(json_file)
+                web_resource_tree = {}
+                for key in reader.iter_object():
+                    if key != 'children':
+                        web_resource_tree[key] = reader.read_value()
+                        continue
+                    assert web_resource_tree['kind'] == 'NalibaliWebResourceTree'
+                    ricecooker_json_tree = dict(
+                        source_domain=NalibaliChef.HOSTNAME,
+                        source_id="nal'ibali",
+                        title=web_resource_tree['title'],
+                        description="""Nal'ibali (isiXhosa for "here's the story") is a national reading-for-enjoyment campaign to spark children's potential through storytelling and reading.""",
+                        language='en',
+                        thumbnail='http://nalibali.org/sites/default/files/nalibali_logo.png',
+                        children=StreamedList(self._scrape_hierarchies(reader)),
+                    )
+                    write_json_stream(json_tree_path, ricecooker_json_tree, ensure_ascii=False, encoding='utf-8')
+        finally:
+            if self._scrape_executor:
+                self._scrape_executor.shutdown()
+                self._scrape_executor = None
+            if self._prefetch_executor:
+                self._prefetch_executor.shutdown()
+                self._prefetch_executor = None
+            if self._image_executor:
+                self._image_executor.shutdown()
+                self._image_executor = None
+            self._scrape_journal.close()
+            self._write_scrape_errors()
+            self._write_unknown_languages()
+        return json_tree_path
+
+    def _load_unselected_topics(self, json_tree_path):
+        # Read whole before the scrape writes the new tree over it
+        self._unselected_topics = {}
+        if not os.path.exists(json_tree_path):
+            self._logger.warning('No previous scrape found, the hierarchies and languages not selected are left out')
+            return
+        with open(json_tree_path, 'r', encoding='utf-8') as json_file:
+            ricecooker_json_tree = json.load(json_file)
+        for topic in ricecooker_json_tree['children']:
+            self._unselected_topics[topic['source_id']] = topic
+            for language_topic in topic.get('children', []):
+                self._unselected_topics[language_topic['source_id']] = language_topic
+
+    def _remove_zip_leftovers(self):
+        # Stories used to be written to temporary directories before they were zipped,
+        # and these were never removed. Zips being written are temporary files until they
+        # are complete, which a killed scrape leaves behind
+        zip_dirs = [NalibaliChef.ZIP_FILES_TMP_DIR, os.path.join(NalibaliChef.ZIP_FILES_TMP_DIR, 'stories')]
+        story_dirs, tmp_zips = [], []
+        for zip_dir in filter(os.path.isdir, zip_dirs):
+            for entry in os.scandir(zip_dir):
+                if not entry.name.startswith('tmp'):
+                    continue
+                if entry.is_dir():
+                    story_dirs.append(entry.path)
+                elif entry.name.endswith('.zip'):
+                    tmp_zips.append(entry.path)
+        for story_dir in story_dirs:
+            shutil.rmtree(story_dir, ignore_errors=True)
+        for tmp_zip in tmp_zips:
+            os.remove(tmp_zip)
+        if story_dirs or tmp_zips:
+            self._logger.info(f'Removed {len(story_dirs)} story directories and {len(tmp_zips)} partial zips left over by previous scrapes')
+
+    def _write_scrape_errors(self):
+        json_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.SCRAPING_STAGE_ERRORS)
+        with open(json_file_name, 'w') as json_file:
+            json.dump(self._scrape_errors, json_file, indent=2)
+        if self._scrape_errors:
+            self._logger.warning(f'{len(self._scrape_errors)} stories failed to scrape and were left out, see ' + json_file_name)
+
+    def _write_unknown_languages(self):
+        # Counted through the metrics, which the scraping workers send back
+        prefix = LanguageTable.UNKNOWN_METRIC_PREFIX
+        unknown_languages = { name[len(prefix):]: count for name, count in METRICS.snapshot()['counters'].items() if name.startswith(prefix) }
+        json_file_name = os.path.join(NalibaliChef.TREES_DATA_DIR, NalibaliChef.SCRAPING_STAGE_UNKNOWN_LANGUAGES)
+        with open(json_file_name, 'w') as json_file:
+            json.dump(unknown_languages, json_file, indent=2, sort_keys=True, ensure_ascii=False)
+        if unknown_languages:
+            self._logger.warning(f'{sum(unknown_languages.values())} nodes in {len(unknown_languages)} unknown languages were given English, see ' + json_file_name)
+
+    def _scrape_hierarchies(self, reader):
+        for _ in reader.iter_array():
+            hierarchy = {}
+            for key in reader.iter_object():
+                if key != 'children':
+                    hierarchy[key] = reader.read_value()
+                    continue
+                scraping_func_name = NalibaliChef.SCRAPING_FUNCS.get(hierarchy['title'])
+                if not scraping_func_name:
+                    self._logger.warning('No scraping function for hierarchy ' + hierarchy['title'])
+                    reader.read_value()
+                    continue
+                if not self._is_selected(hierarchy['title'], self._selected_hierarchies):
+                    reader.read_value()
+                    if hierarchy['title'] in self._unselected_topics:
+                        yield self._unselected_topics[hierarchy['title']]
+                    continue
+                hierarchy['children'] = self._read_stories_by_language(reader)
+                yield self._scrape_hierarchy(hierarchy, getattr(self, scraping_func_name))
+
+    def _read_stories_by_language(self, reader):
+        for language in reader.iter_object():
+            yield language, (reader.read_value() for _ in reader.iter_array())
+
+    def _configure_scrape(self, kwargs):
+        self._configure_http(kwargs)
+        # Set here rather than in crawl, for scrape-only runs and the scraping workers
+        self._html.limit_connections_per_host(kwargs.get('max_connections_per_host'))
+        self._image_store = ImageStore(self._html, NalibaliChef.IMAGES_DIR, since=kwargs['scrape_started'])
+        self._zip_manifest = ZipManifest(NalibaliChef.ZIP_FILES_TMP_DIR) if kwargs.get('reuse_zips') else None
+        self._zip_store_media = kwargs.get('zip_store_media', False)
+        self._html.set_parser(kwargs.get('html_parser') or 'html.parser')
+        if kwargs.get('optimize_images'):
+            self._image_optimizer = ImageOptimizer(os.path.join(NalibaliChef.IMAGES_DIR, 'optimized'),
+                kwargs.get('image_max_dimension') or 1024, kwargs.get('image_quality') or 75)
+            # Pillow releases the GIL while decoding, resizing and encoding, so the
+            # images of a story are optimized in parallel by threads
+            self._image_executor = ThreadPoolExecutor(max_workers=max(1, kwargs.get('image_workers') or os.cpu_count()))
 
     def _scrape_hierarchy(self, hierarchy, story_scraping_func):
+        """
+        Returns the topic node of the hierarchy. Its children are scraped while the node
+        is being written out. hierarchy['children'] is either a dict or an iterable of
+        (language, stories) pairs.
+        """
         assert hierarchy['kind'] == 'NalibaliHierarchy'
-        items = hierarchy.get('children', {}).items()
-        hierarchy_name = hierarchy['title'].replace(' ', '_')
-        hierarchy_by_language = [None] * len(items)
-        for i, (language, stories) in enumerate(items):
-            stories_nodes = [story for story in map(story_scraping_func, stories) if story]
-            topic_node = dict(
-                kind=content_kinds.TOPIC,
-                source_id=f'{hierarchy_name}_{language}',
-                title=language,
-                description=f'Stories in {language}',
-                children=stories_nodes,
-            )
-            hierarchy_by_language[i] = topic_node
         hierarchy_title = hierarchy['title']
         return dict(
             kind=content_kinds.TOPIC,
             source_id=hierarchy_title,
             title=hierarchy_title,
             description=hierarchy['description'],
-            children=hierarchy_by_language,
+            children=StreamedList(self._scrape_hierarchy_languages(hierarchy, story_scraping_func)),
             thumbnail=hierarchy['thumbnail'],
         )
 
+    def _scrape_hierarchy_languages(self, hierarchy, story_scraping_func):
+        items = hierarchy.get('children', {})
+        items = items.items() if isinstance(items, dict) else items
+        hierarchy_name = hierarchy['title'].replace(' ', '_')
+        bytes_saved = METRICS.snapshot()['counters'].get('images.bytes_saved', 0)
+        with METRICS.timer(f"scrape.hierarchy.{hierarchy['title']}"):
+            for language, stories in items:
+                if not self._is_selected(language, self._selected_languages):
+                    # The crawling output is read in order, so the stories are read past
+                    for _ in stories:
+                        pass
+                    if f'{hierarchy_name}_{language}' in self._unselected_topics:
+                        yield self._unselected_topics[f'{hierarchy_name}_{language}']
+                    continue
+                yield dict(
+                    kind=content_kinds.TOPIC,
+                    source_id=f'{hierarchy_name}_{language}',
+                    title=language,
+                    description=f'Stories in {language}',
+                    children=StreamedList(story for story in self._prefetch_map(self._scrape_map(story_scraping_func, stories)) if story),
+                )
+        if self._image_optimizer:
+            # Hierarchies are scraped one after the other, so the difference is what
+            # the images of this hierarchy saved
+            bytes_saved = METRICS.snapshot()['counters'].get('images.bytes_saved', 0) - bytes_saved
+            METRICS.increment(f"images.bytes_saved.{hierarchy['title']}", bytes_saved)
+            self._logger.info(f"{hierarchy['title']}: {bytes_saved / 1e6:.1f} MB saved by optimizing images")
+
+    def _prefetch_map(self, story_nodes):
+        if not self._prefetch_executor:
+            return story_nodes
+        # The stories of a language are scraped while the files of the first ones download
+        return self._prefetch_executor.map(self._prefetch_story_node, story_nodes)
+
+    def _prefetch_story_node(self, story_node):
+        if not story_node:
+            return story_node
+        files = []
+        for f in story_node.get('files', []):
+            if f['file_type'] in NalibaliChef.PREFETCHED_FILE_TYPES and f['path'].startswith('http'):
+                try:
+                    f = dict(f, path=self._media_store.get(f['path']))
+                except Exception as e:
+                    # Left to ricecooker to download during the upload
+                    METRICS.increment('prefetch.failed')
+                    self._logger.warning(f"Failed to prefetch {f['path']}: {e}")
+            files.append(f)
+        return dict(story_node, files=files)
+
+    def _scrape_map(self, story_scraping_func, stories):
+        stories = list(stories)
+        entries = [self._scrape_journal.get(story) for story in stories]
+        pending_stories = [story for story, entry in zip(stories, entries) if not entry]
+        results = self._scrape_pending_stories(story_scraping_func, pending_stories)
+        for story, entry in zip(stories, entries):
+            if entry:
+                METRICS.increment('scrape.stories_resumed')
+                yield entry['node']
+                continue
+            story_node, error = next(results)
+            if error:
+                # Quarantined rather than aborting the scrape, and retried by the next run
+                METRICS.increment('scrape.stories_failed')
+                self._logger.error(f"Failed to scrape {story.get('url')}: {error['error']}")
+                self._scrape_errors.append(error)
+                yield None
+                continue
+            self._scrape_journal.record(story, story_node)
+            yield story_node
+
+    def _scrape_pending_stories(self, story_scraping_func, stories):
+        if not self._scrape_executor:
+            yield from map(self._scrape_story_safely, repeat(story_scraping_func), stories)
+            return
+        # Bound methods cannot be sent to other processes, so the workers look the
+        # scraping function up by name on their own chef instance
+        results = self._scrape_executor.map(_scrape_story_in_worker, repeat(story_scraping_func.__name__), stories)
+        for story_node, error, worker_metrics in results:
+            METRICS.merge(worker_metrics)
+            yield story_node, error
+
+    def _scrape_story_safely(self, story_scraping_func, story):
+        try:
+            return story_scraping_func(story), None
+        except Exception as e:
+            return None, dict(
+                story=story,
+                scraping_func=story_scraping_func.__name__,
+                error=f'{type(e).__name__}: {e}',
+                traceback=traceback.format_exc(),
+            )
+
     def _scrape_multilingual_story(self, story):
         return self._scrape_story_html5(story)
 
@@ -409,7 +2638,7 @@ class NalibaliChef(JsonTreeChef):
             kind=content_kinds.AUDIO,
             source_id=story['source_id'],
             title=story['title'],
-            license=NalibaliChef.LICENSE,
+            license=NalibaliChef._license(),
             author=story['author'],
             description=story['description'],
             domain_ns=NalibaliChef.HOSTNAME,
@@ -435,7 +2664,7 @@ class NalibaliChef(JsonTreeChef):
                 kind=content_kinds.DOCUMENT,
                 title=story['title'],
                 description=story['description'],
-                license=NalibaliChef.LICENSE,
+                license=NalibaliChef._license(),
                 author=story['author'],
                 thumbnail=story['thumbnail'],
                 language=lang_code,
@@ -454,11 +2683,11 @@ class NalibaliChef(JsonTreeChef):
     def _scrape_your_story(self, story):
         return self._scrape_story_html5(story)
 
-    def _scrape_download_image(self, base_path, img):
+    def _scrape_image_urls(self, img):
         url = img['src']
 
         if not url:
-            return
+            return None
 
         if url.startswith('http') or url.startswith('https'):
             absolute_url = url
@@ -467,26 +2696,45 @@ class NalibaliChef(JsonTreeChef):
         else:
             absolute_url = self.__absolute_url(url)
             relative_url = url
+        return absolute_url, relative_url
 
-        self._scrape_download_image_helper(base_path, img, absolute_url, relative_url)
+    def _scrape_download_image(self, story_zip, img, position=0):
+        urls = self._scrape_image_urls(img)
 
-    def _scrape_download_image_helper(self, base_path, img, absolute_url, relative_url):
-        image_response = self._html.get_image(absolute_url)
-        if image_response.status_code != 200:
+        if not urls:
             return
-        filename = os.path.basename(relative_url)
-        subdirs = os.path.dirname(relative_url).split('/')
-        image_dir = os.path.join(base_path, *subdirs)
-        pathlib.Path(image_dir).mkdir(parents=True, exist_ok=True)
-        image_path = os.path.join(image_dir, filename)
-        with open(image_path, 'wb') as f:
-            image_response.raw.decode_content = True
-            shutil.copyfileobj(image_response.raw, f)
+
+        absolute_url, relative_url = urls
+        self._scrape_download_image_helper(story_zip, img, absolute_url, relative_url, position)
+
+    def _scrape_story_fingerprint(self, story_section_str, image_urls, image_paths):
+        fingerprint = hashlib.sha256(story_section_str.encode('utf-8'))
+        for url, path in zip(image_urls, image_paths):
+            fingerprint.update(url.encode('utf-8'))
+            # Images are stored under the hash of their content
+            fingerprint.update((os.path.basename(path) if path else '').encode('utf-8'))
+        if self._image_optimizer:
+            fingerprint.update(self._image_optimizer.settings.encode('utf-8'))
+        if self._zip_store_media:
+            fingerprint.update(b'store_media')
+        return fingerprint.hexdigest()
+
+    @timed('scrape.download_image')
+    def _scrape_download_image_helper(self, story_zip, img, absolute_url, relative_url, position=0):
+        stored_image_path = self._image_store.get(absolute_url)
+        if not stored_image_path:
+            return
+        if self._image_optimizer:
+            stored_image_path = self._image_optimizer.optimize(stored_image_path)
+        # The path the image had in the story directory that used to be zipped
+        image_path = os.path.normpath(os.path.join(*os.path.dirname(relative_url).split('/'), os.path.basename(relative_url)))
+        story_zip.add_file(image_path, stored_image_path, position)
         img['src'] = relative_url[1:] if relative_url[0] == '/' else relative_url
 
+    @timed('scrape.story_html5')
     def _scrape_story_html5(self, story):
         url = story['url']
-        page = self._html.get(url)
+        page = self._html.get(url, parse_only=NalibaliChef.SECTION_MAIN_ONLY)
         story_section = page.find('section', id='section-main')
         links_section = story_section.find('div', class_='languages-links')
 
@@ -496,10 +2744,46 @@ class NalibaliChef(JsonTreeChef):
 
         title = self.__get_text(story_section.find('h1', class_='page-header'))
         language_code = self.__get_language_code(story['language'])
-        dest_path = tempfile.mkdtemp(dir=NalibaliChef.ZIP_FILES_TMP_DIR)
+        parsed_story_url = urlparse(url)
+        source_id = parsed_story_url.path if parsed_story_url else url
+        zip_path = self._scrape_story_zip(source_id, story_section)
+        return dict(
+            kind=content_kinds.HTML5,
+            source_id=source_id,
+            title=title,
+            language=language_code,
+            description=story['description'],
+            license=NalibaliChef._license(),
+            thumbnail=story['thumbnail'],
+            files=[dict(
+                file_type=content_kinds.HTML5,
+                path=zip_path,
+                language=language_code,
+            )],
+        )
 
-        for img in story_section.find_all('img'):
-            self._scrape_download_image(dest_path, img)
+    def _scrape_story_zip(self, source_id, story_section):
+        imgs = story_section.find_all('img')
+        if self._zip_manifest:
+            image_urls = [urls[0] for urls in map(self._scrape_image_urls, imgs) if urls]
+            # The images are fetched again through the HTTP cache, which revalidates them,
+            # so that an image that changed at the same URL changes the fingerprint
+            if self._image_executor:
+                image_paths = list(self._image_executor.map(self._image_store.get, image_urls))
+            else:
+                image_paths = list(map(self._image_store.get, image_urls))
+            fingerprint = self._scrape_story_fingerprint(str(story_section), image_urls, image_paths)
+            zip_path = self._zip_manifest.get(source_id, fingerprint)
+            if zip_path:
+                return zip_path
+
+        story_zip = PredictableZip(store_media=self._zip_store_media)
+
+        if self._image_executor:
+            list(self._image_executor.map(self._scrape_download_image, repeat(story_zip), imgs, range(len(imgs))))
+        else:
+            for position, img in enumerate(imgs):
+                self._scrape_download_image(story_zip, img, position)
 
         basic_page_str = """
         <!DOCTYPE html>
@@ -514,33 +2798,105 @@ class NalibaliChef(JsonTreeChef):
         basic_page = BeautifulSoup(basic_page_str, "html.parser")
         body = basic_page.find('body')
         body.append(story_section)
-        with open(os.path.join(dest_path, 'index.html'), 'w', encoding="utf8") as index_html:
-            index_html.write(str(basic_page))
-        zip_path = create_predictable_zip(dest_path)
-        parsed_story_url = urlparse(url)
-        return dict(
-            kind=content_kinds.HTML5,
-            source_id=parsed_story_url.path if parsed_story_url else url,
-            title=title,
-            language=language_code,
-            description=story['description'],
-            license=NalibaliChef.LICENSE,
-            thumbnail=story['thumbnail'],
-            files=[dict(
-                file_type=content_kinds.HTML5,
-                path=zip_path,
-                language=language_code,
-            )],
-        )
+        story_zip.add_bytes('index.html', str(basic_page).encode('utf-8'))
+        if self._zip_manifest:
+            with METRICS.timer('scrape.zip'):
+                zip_path = story_zip.write(self._zip_manifest.zip_path(source_id, fingerprint))
+            return self._zip_manifest.put(source_id, fingerprint, zip_path)
+        # Named after the story, so the journal entry of the story stays valid for --resume-scrape
+        source_id_hash = hashlib.sha256(source_id.encode('utf-8')).hexdigest()
+        with METRICS.timer('scrape.zip'):
+            return story_zip.write(os.path.join(NalibaliChef.ZIP_FILES_TMP_DIR, 'stories', source_id_hash + '.zip'))
 
     #endregion Scraping
 
     def pre_run(self, args, options):
-        self.crawl(args, options)
-        self.scrape(args, options)
+        metrics_file = args.get('metrics_file')
+        if metrics_file and hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: METRICS.dump_in_background(metrics_file))
+        only_stage = args.get('only_stage')
+        if only_stage != 'scrape':
+            self.crawl(args, options)
+        if only_stage != 'crawl':
+            self.scrape(args, options)
+        self._log_metrics()
+        if metrics_file:
+            METRICS.dump(metrics_file)
+            self._logger.info('Metrics stored in ' + metrics_file)
+
+    def run(self, args, options):
+        if args.get('only_stage') != 'crawl':
+            super(NalibaliChef, self).run(args, options)
+            return
+        # ricecooker uploads the tree right after pre_run, which would be the one of the
+        # previous scrape
+        self.pre_run(args, options)
+        self._logger.info('Crawl only, not scraping nor uploading')
+
+    def _log_metrics(self):
+        summary = METRICS.summary()
+        counters = summary['counters']
+        cache_hit_ratio = summary['cache_hit_ratio']
+        self._logger.info('HTTP: {} requests, {:.1%} cache hits, {:.1f} MB'.format(
+            counters.get('http.cache_hits', 0) + counters.get('http.cache_misses', 0),
+            cache_hit_ratio or 0,
+            counters.get('http.bytes', 0) / 1e6,
+        ))
+        if counters.get('http.retries') or counters.get('http.throttled'):
+            self._logger.info('HTTP: {} retries, {} throttled responses'.format(
+                counters.get('http.retries', 0),
+                counters.get('http.throttled', 0),
+            ))
+        if any(name.startswith('prefetch.') for name in counters):
+            self._logger.info('Prefetch: {} files downloaded, {} resumed, {} reused, {} failed, {:.1f} MB'.format(
+                counters.get('prefetch.downloaded', 0),
+                counters.get('prefetch.resumed', 0),
+                counters.get('prefetch.reused', 0),
+                counters.get('prefetch.failed', 0),
+                counters.get('prefetch.bytes', 0) / 1e6,
+            ))
+        if any(name.startswith('parse_memo.') for name in counters):
+            self._logger.info('Parse memo: {} hits, {} misses, {} evictions'.format(
+                counters.get('parse_memo.hits', 0),
+                counters.get('parse_memo.misses', 0),
+                counters.get('parse_memo.evictions', 0),
+            ))
+        if any(name.startswith('http_cache.') for name in counters):
+            self._logger.info('HTTP cache: {} memory hits, {} disk hits, {} misses, {} evictions'.format(
+                counters.get('http_cache.memory_hits', 0),
+                counters.get('http_cache.disk_hits', 0),
+                counters.get('http_cache.disk_misses', 0),
+                counters.get('http_cache.evictions', 0),
+            ))
+        if isinstance(self._http_cache, TieredCache):
+            stats = self._http_cache.stats()
+            self._logger.info('HTTP cache size: {:.1f} MB in memory, {:.1f} MB in {} entries on disk'.format(
+                stats['memory']['size'] / 1e6, stats['disk']['size'] / 1e6, stats['disk']['entries']))
+        for name, latency in summary['latencies'].items():
+            if name.startswith(('http.', 'crawl.hierarchy.', 'scrape.hierarchy.', 'scrape.zip')):
+                self._logger.info(f"{name}: {latency['count']} calls, {latency['total_s']}s total, {latency['max_s']}s max")
 
 #endregion Nalibali Chef
 
+#region Scraping workers
+_worker_chef = None
+
+def _init_scrape_worker(kwargs):
+    # Each worker process owns its own chef and HTTP session
+    global _worker_chef
+    http_session = create_http_session(NalibaliChef.HOSTNAME)
+    logger = create_logger()
+    _worker_chef = NalibaliChef(Html(http_session, logger), logger)
+    _worker_chef._configure_scrape(kwargs)
+
+def _scrape_story_in_worker(story_scraping_func_name, story):
+    # Metrics are sent back with every story so the parent process can merge them
+    METRICS.reset()
+    story_node, error = _worker_chef._scrape_story_safely(getattr(_worker_chef, story_scraping_func_name), story)
+    return story_node, error, METRICS.snapshot()
+
+#endregion Scraping workers
+
 def __get_testing_chef():
     http_session = create_http_session(NalibaliChef.HOSTNAME)
     logger = create_logger()
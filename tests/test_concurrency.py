@@ -0,0 +1,49 @@
+import json
+import logging
+import os
+
+import pytest
+
+from benchmarks.fixture_site import FixtureSite
+from nalibali_chef import Html, NalibaliChef, create_http_session
+
+
+@pytest.fixture(scope='module')
+def site():
+    site = FixtureSite(stories_per_hierarchy=12, images_per_story=2, episodes_per_language=3, image_size=2000, aliases=True)
+    server = site.serve()
+    yield site
+    server.shutdown()
+
+
+def run_chef(site, workdir, chef_args, monkeypatch):
+    """Crawls and scrapes the fixture site in workdir, and returns the trees and zips written"""
+    for data_dir in (NalibaliChef.TREES_DATA_DIR, NalibaliChef.ZIP_FILES_TMP_DIR):
+        os.makedirs(os.path.join(workdir, data_dir))
+    monkeypatch.chdir(workdir)
+    monkeypatch.setattr(NalibaliChef, 'HOSTNAME', site.host)
+    monkeypatch.setattr(NalibaliChef, 'ROOT_URL', f'http://{site.host}/story-library')
+    logger = logging.getLogger(__name__)
+    chef = NalibaliChef(Html(create_http_session(NalibaliChef.HOSTNAME), logger), logger)
+    args = vars(chef.arg_parser.parse_args(chef_args))
+    chef.crawl(args, {})
+    chef.scrape(args, {})
+    outputs = {}
+    for name in (NalibaliChef.CRAWLING_STAGE_OUTPUT, NalibaliChef.SCRAPING_STAGE_OUTPUT):
+        with open(os.path.join(NalibaliChef.TREES_DATA_DIR, name), 'rb') as json_file:
+            outputs[name] = json_file.read()
+    for root, _, file_names in os.walk(NalibaliChef.ZIP_FILES_TMP_DIR):
+        for file_name in file_names:
+            with open(os.path.join(root, file_name), 'rb') as zip_file:
+                outputs[os.path.join(root, file_name)] = zip_file.read()
+    return outputs
+
+
+def test_concurrent_run_writes_the_same_trees_and_zips_as_the_serial_run(site, tmp_path, monkeypatch):
+    serial = run_chef(site, tmp_path / 'serial', ['--crawl-workers=1', '--dedup-stories'], monkeypatch)
+    concurrent = run_chef(site, tmp_path / 'concurrent', ['--crawl-workers=4', '--scrape-workers=2', '--dedup-stories'], monkeypatch)
+    assert sorted(concurrent) == sorted(serial)
+    for name in serial:
+        assert concurrent[name] == serial[name], name
+    tree = json.loads(serial[NalibaliChef.SCRAPING_STAGE_OUTPUT])
+    assert len(tree['children']) == 5
@@ -0,0 +1,61 @@
+import io
+
+import requests
+from requests.adapters import BaseAdapter
+
+from nalibali_chef import HttpArchive, RecordingAdapter, ReplayAdapter
+
+URL = 'http://nalibali.org/feed.xml'
+BODY = b'<rss><channel></channel></rss>'
+
+
+class FakeAdapter(BaseAdapter):
+    """Answers every request with the next of the given (status, body)"""
+
+    def __init__(self, *responses):
+        super().__init__()
+        self._responses = list(responses)
+
+    def send(self, request, **kwargs):
+        status, body = self._responses.pop(0)
+        response = requests.Response()
+        response.status_code = status
+        response.headers['ETag'] = '"feed"'
+        response.raw = io.BytesIO(body)
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def session(adapter):
+    sess = requests.Session()
+    sess.mount('http://', adapter)
+    return sess
+
+
+def test_replay_serves_the_recorded_response(tmp_path):
+    archive = HttpArchive(str(tmp_path / 'archive.sqlite'))
+    session(RecordingAdapter(FakeAdapter((200, BODY)), archive)).get(URL)
+    response = session(ReplayAdapter(archive)).get(URL)
+    assert response.status_code == 200
+    assert response.content == BODY
+
+
+def test_partial_responses_do_not_replace_the_full_one(tmp_path):
+    archive = HttpArchive(str(tmp_path / 'archive.sqlite'))
+    recording = session(RecordingAdapter(FakeAdapter((200, BODY), (304, b''), (206, BODY[5:])), archive))
+    recording.get(URL)
+    assert recording.get(URL, headers={'If-None-Match': '"feed"'}).status_code == 304
+    assert recording.get(URL, headers={'Range': 'bytes=5-', 'If-Range': '"feed"'}).status_code == 206
+    response = session(ReplayAdapter(archive)).get(URL)
+    assert response.status_code == 200
+    assert response.content == BODY
+
+
+def test_full_response_to_a_conditional_request_is_recorded(tmp_path):
+    archive = HttpArchive(str(tmp_path / 'archive.sqlite'))
+    session(RecordingAdapter(FakeAdapter((200, BODY)), archive)).get(URL, headers={'If-None-Match': '"old"'})
+    assert session(ReplayAdapter(archive)).get(URL).content == BODY
@@ -0,0 +1,138 @@
+import types
+
+import pytest
+
+import nalibali_chef
+from nalibali_chef import Metrics, SqliteCache, SqliteStore, TieredCache, create_http_cache
+
+
+class FakeClock:
+    """Stands in for the time module, one second later at every call, so that access times never tie"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(nalibali_chef, 'METRICS', metrics)
+    clock = FakeClock()
+    monkeypatch.setattr(nalibali_chef, 'time', types.SimpleNamespace(time=clock.time))
+    return metrics
+
+
+def counter(metrics, name):
+    return metrics.snapshot()['counters'].get(name, 0)
+
+
+def value(i):
+    return bytes([i]) * 100
+
+
+def test_cache_is_evicted_down_to_the_target_in_access_order(tmp_path, metrics):
+    cache = SqliteCache(str(tmp_path / 'cache.sqlite'), max_size=500)
+    for i in range(5):
+        cache.set(f'key{i}', value(i))
+    # Read, so the next write goes past max_size with key1 and key2 the least recently used
+    assert cache.get('key0') == value(0)
+    cache.set('key5', value(5))
+    assert cache.get('key1') is None
+    assert cache.get('key2') is None
+    assert [cache.get(f'key{i}') for i in (0, 3, 4, 5)] == [value(i) for i in (0, 3, 4, 5)]
+    assert cache.stats() == dict(entries=4, size=400, max_size=500)
+    assert cache.stats()['size'] <= 500 * SqliteStore.EVICTION_TARGET
+    assert counter(metrics, 'http_cache.evictions') == 2
+
+
+def test_eviction_counts_the_entries_written_by_other_processes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = SqliteCache(path, max_size=500)
+    other_process = SqliteCache(path, max_size=500)
+    for i in range(3):
+        other_process.set(f'other{i}', value(i))
+    # Each process only counts its own writes until they reach max_size, then the
+    # whole cache is brought down to the target
+    for i in range(6):
+        cache.set(f'key{i}', value(i))
+    assert cache.stats()['size'] <= 500 * SqliteStore.EVICTION_TARGET
+    assert [other_process.get(f'other{i}') for i in range(3)] == [None] * 3
+
+
+def test_unbounded_cache_is_never_evicted(tmp_path, metrics):
+    cache = SqliteCache(str(tmp_path / 'cache.sqlite'))
+    for i in range(20):
+        cache.set(f'key{i}', value(i))
+    assert cache.stats()['entries'] == 20
+    assert counter(metrics, 'http_cache.evictions') == 0
+
+
+def test_access_times_are_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(SqliteStore, 'ACCESS_BATCH_SIZE', 3)
+    path = str(tmp_path / 'cache.sqlite')
+    cache = SqliteCache(path)
+    cache.set('key', value(0))
+
+    def accessed():
+        return cache._connection.execute('SELECT accessed FROM entries WHERE key = ?', ('key',)).fetchone()[0]
+
+    for other in ('other0', 'other1'):
+        cache.set(other, value(1))
+    written = accessed()
+    # Reads of the same entry only keep its last access time
+    for key in ('key', 'key', 'other0'):
+        cache.get(key)
+    assert accessed() == written
+    cache.get('other1')
+    assert accessed() > written
+    written = accessed()
+    cache.get('key')
+    cache.close()
+    assert SqliteCache(path)._connection.execute('SELECT accessed FROM entries WHERE key = ?', ('key',)).fetchone()[0] > written
+
+
+def test_tiered_cache_promotes_disk_entries_to_memory(tmp_path, metrics):
+    path = str(tmp_path / 'cache.sqlite')
+    SqliteCache(path).set('key', value(1))
+    cache = TieredCache(SqliteCache(path), memory_size=1000)
+    assert cache.get('key') == value(1)
+    assert cache.get('key') == value(1)
+    assert counter(metrics, 'http_cache.disk_hits') == 1
+    assert counter(metrics, 'http_cache.memory_hits') == 1
+    assert cache.stats()['memory'] == dict(entries=1, size=100, max_size=1000)
+
+
+def test_tiered_cache_keeps_the_most_recently_used_entries_in_memory(tmp_path, metrics):
+    cache = TieredCache(SqliteCache(str(tmp_path / 'cache.sqlite')), memory_size=250)
+    cache.set('key0', value(0))
+    cache.set('key1', value(1))
+    cache.get('key0')
+    cache.set('key2', value(2))
+    assert cache.stats()['memory'] == dict(entries=2, size=200, max_size=250)
+    # key1 was dropped from memory, but is still on disk
+    assert cache.get('key1') == value(1)
+    assert counter(metrics, 'http_cache.disk_hits') == 1
+    # Entries larger than the memory tier only go to disk
+    cache.set('large', bytes(300))
+    assert cache.stats()['memory']['size'] <= 250
+    assert cache.get('large') == bytes(300)
+
+
+def test_tiered_cache_deletes_from_both_tiers(tmp_path):
+    cache = TieredCache(SqliteCache(str(tmp_path / 'cache.sqlite')), memory_size=1000)
+    cache.set('key', value(0))
+    cache.delete('key')
+    assert cache.get('key') is None
+    assert cache.stats()['disk']['entries'] == 0
+
+
+def test_http_cache_sizes_are_given_in_megabytes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stats = create_http_cache('tiered', memory_size_mb=1, max_size_mb=2).stats()
+    assert stats['memory']['max_size'] == 1024 * 1024
+    assert stats['disk']['max_size'] == 2 * 1024 * 1024
+    assert create_http_cache('tiered', memory_size_mb=1).stats()['disk']['max_size'] is None
@@ -0,0 +1,57 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from nalibali_chef import ImageStore
+
+URL = 'http://nalibali.org/sites/default/files/story.jpg'
+BODY = b'\xff\xd8' + bytes(range(256)) * 4
+
+
+class ClosingRaw(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.released = False
+
+    def release_conn(self):
+        self.released = True
+
+
+class FakeHtml:
+    """Serves BODY with the given status, slowly enough for concurrent requests to overlap"""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.responses = []
+        self._lock = threading.Lock()
+
+    def get_image(self, url):
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.raw = ClosingRaw(BODY)
+        with self._lock:
+            self.responses.append(response)
+        threading.Event().wait(0.05)
+        return response
+
+
+def test_image_requested_by_several_threads_is_downloaded_once(tmp_path):
+    html = FakeHtml()
+    store = ImageStore(html, str(tmp_path))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        paths = list(executor.map(store.get, [URL] * 4))
+    assert len(set(paths)) == 1
+    assert len(html.responses) == 1
+    # The lock of the URL is dropped once the download is over
+    assert len(store._url_locks) == 0
+    with open(paths[0], 'rb') as f:
+        assert f.read() == BODY
+
+
+def test_failed_download_releases_its_connection(tmp_path):
+    html = FakeHtml(status_code=404)
+    assert ImageStore(html, str(tmp_path)).get(URL) is None
+    assert html.responses[0].raw.released
+    assert html.responses[0].raw.closed
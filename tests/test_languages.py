@@ -0,0 +1,49 @@
+import json
+import logging
+import os
+
+import pytest
+from le_utils.constants.languages import LANGUAGELIST, getlang_by_name, getlang_by_native_name
+
+from nalibali_chef import LanguageTable
+
+TREE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'chefdata', 'trees', 'web_resource_tree.json')
+
+
+def tree_languages():
+    with open(TREE_PATH) as json_file:
+        hierarchies = json.load(json_file)['children']
+    languages = set()
+    for hierarchy in hierarchies:
+        for language, stories in hierarchy['children'].items():
+            languages.add(language)
+            languages.update(story['language'] for story in stories if story.get('language'))
+    return sorted(languages)
+
+
+def le_utils_code(name):
+    language = getlang_by_name(name) or getlang_by_native_name(name)
+    return language.code if language else None
+
+
+@pytest.fixture(scope='module')
+def table():
+    return LanguageTable(logging.getLogger(__name__))
+
+
+@pytest.mark.parametrize('spelling', sorted(LanguageTable.ALIASES) + [name.upper() for name in LanguageTable.ALIASES])
+def test_site_spellings_resolve_like_le_utils(table, spelling):
+    assert table.code(spelling) == le_utils_code(table.name(spelling))
+
+
+@pytest.mark.parametrize('language', tree_languages())
+def test_tree_languages_resolve_like_le_utils(table, language):
+    name = table.name(language)
+    assert le_utils_code(name)
+    assert table.code(name) == le_utils_code(name)
+
+
+def test_le_utils_names_resolve_like_le_utils(table):
+    names = set(language.name for language in LANGUAGELIST) | set(language.native_name for language in LANGUAGELIST)
+    codes = { name: (table.code(name), le_utils_code(name)) for name in names if name and le_utils_code(name) }
+    assert { name: pair for name, pair in codes.items() if pair[0] != pair[1] } == {}
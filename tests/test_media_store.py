@@ -0,0 +1,163 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from urllib3.exceptions import ProtocolError
+
+import nalibali_chef
+from nalibali_chef import Html, IncompleteDownload, MediaStore, Metrics
+
+URL = 'http://nalibali.org/sites/default/files/story.mp3'
+BODY = bytes(range(256)) * 40
+ETAG = '"' + hashlib.md5(BODY).hexdigest() + '"'
+
+
+class BrokenRaw(io.BytesIO):
+    """Body of a response whose connection drops after limit bytes"""
+
+    def __init__(self, data, limit):
+        super().__init__(data[:limit])
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        if not chunk:
+            raise ProtocolError('Connection broken: IncompleteRead')
+        return chunk
+
+
+def response(status_code, body, headers, raw=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    response.raw = raw or io.BytesIO(body)
+    return response
+
+
+class FakeHtml:
+    """Serves BODY through responses, and records the headers of each request"""
+
+    def __init__(self, *responses):
+        self._responses = list(responses)
+        self.requests = []
+
+    def get_stream(self, url, headers=None):
+        self.requests.append(dict(headers or {}))
+        return self._responses.pop(0)(headers or {})
+
+
+def broken(headers):
+    return response(200, BODY, {'Content-Length': str(len(BODY)), 'ETag': ETAG}, raw=BrokenRaw(BODY, 1000))
+
+
+def partial(headers):
+    start = int(headers['Range'][len('bytes='):-1])
+    return response(206, BODY[start:], {
+        'Content-Length': str(len(BODY) - start),
+        'Content-Range': f'bytes {start}-{len(BODY) - 1}/{len(BODY)}',
+        'ETag': ETAG,
+    })
+
+
+def full(headers):
+    return response(200, BODY, {'Content-Length': str(len(BODY)), 'ETag': ETAG})
+
+
+def not_modified(headers):
+    return response(304, b'', {'ETag': ETAG})
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(nalibali_chef, 'METRICS', metrics)
+    monkeypatch.setattr(MediaStore, 'CHUNK_SIZE', 64)
+    monkeypatch.setattr(MediaStore, 'RETRY_DELAY', 0)
+    return metrics
+
+
+def counter(metrics, name):
+    return metrics.snapshot()['counters'].get(name, 0)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_broken_download_is_resumed_with_a_range_request(tmp_path, metrics):
+    html = FakeHtml(broken, partial)
+    path = MediaStore(html, str(tmp_path)).get(URL)
+    assert read(path) == BODY
+    assert html.requests == [{}, {'Range': 'bytes=1000-', 'If-Range': ETAG}]
+    assert counter(metrics, 'prefetch.resumed') == 1
+    assert counter(metrics, 'prefetch.retries') == 1
+
+
+def test_download_starts_over_when_the_server_ignores_the_range(tmp_path, metrics):
+    html = FakeHtml(broken, full)
+    path = MediaStore(html, str(tmp_path)).get(URL)
+    assert read(path) == BODY
+    assert html.requests[1]['Range'] == 'bytes=1000-'
+    assert counter(metrics, 'prefetch.resumed') == 0
+    assert counter(metrics, 'prefetch.downloaded') == 1
+
+
+def test_download_that_keeps_breaking_is_given_up(tmp_path):
+    html = FakeHtml(*[broken] * MediaStore.RETRIES)
+    with pytest.raises(IncompleteDownload):
+        MediaStore(html, str(tmp_path)).get(URL)
+
+
+def test_later_runs_revalidate_the_file(tmp_path):
+    MediaStore(FakeHtml(full), str(tmp_path)).get(URL)
+    html = FakeHtml(not_modified)
+    path = MediaStore(html, str(tmp_path)).get(URL)
+    assert read(path) == BODY
+    assert html.requests == [{'If-None-Match': ETAG}]
+
+
+class SlowRaw(io.BytesIO):
+    """Body that takes a while to transfer, so that concurrent downloads overlap"""
+
+    def read(self, size=-1):
+        if not self.tell():
+            threading.Event().wait(0.02)
+        return super().read(size)
+
+
+class StreamingSession:
+    """Serves BODY to every request, and counts the responses open at the same time"""
+
+    def __init__(self):
+        self.open = 0
+        self.max_open = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.open += 1
+            self.max_open = max(self.max_open, self.open)
+        served = response(200, BODY, {'Content-Length': str(len(BODY)), 'ETag': ETAG}, raw=SlowRaw(BODY))
+        close = served.close
+        def closed():
+            with self._lock:
+                self.open -= 1
+            close()
+        served.close = closed
+        return served
+
+
+def test_downloads_share_the_connections_per_host(tmp_path):
+    session = StreamingSession()
+    store = MediaStore(Html(session, logging.getLogger(__name__), max_connections_per_host=2), str(tmp_path))
+    urls = [f'http://nalibali.org/sites/default/files/story-{i}.mp3' for i in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(store.get, urls))
+    assert all(read(path) == BODY for path in paths)
+    assert len(store._url_locks) == 0
+    assert session.max_open == 2
+    assert session.open == 0
@@ -0,0 +1,121 @@
+import logging
+
+import pytest
+import requests
+
+import nalibali_chef
+from nalibali_chef import Html, Metrics, ParseMemo
+
+URL = 'http://nalibali.org/story-library/multilingual-stories'
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(nalibali_chef, 'METRICS', metrics)
+    return metrics
+
+
+class FakeSession:
+    """Serves the page set in body, with the given ETag when there is one"""
+
+    def __init__(self, body, etag=None):
+        self.body = body
+        self.etag = etag
+
+    def get(self, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        if self.etag:
+            response.headers['ETag'] = self.etag
+        response._content = self.body.encode('utf-8')
+        response.from_cache = False
+        return response
+
+
+def page(*titles):
+    return '<html><body>' + ''.join(f'<h2>{title}</h2>' for title in titles) + '</body></html>'
+
+
+def story_titles(page):
+    return [h2.get_text() for h2 in page.find_all('h2')]
+
+
+class Extractions:
+    """Extracts the story titles, and counts the pages it is run on"""
+
+    def __init__(self):
+        self.__name__ = 'story_titles'
+        self.count = 0
+
+    def __call__(self, page):
+        self.count += 1
+        return story_titles(page)
+
+
+@pytest.fixture
+def memo(tmp_path):
+    return ParseMemo(str(tmp_path / 'parsememo.sqlite'))
+
+
+def html_with(session, memo):
+    html = Html(session, logging.getLogger(__name__))
+    html.set_parse_memo(memo)
+    return html
+
+
+def test_value_is_reused_while_the_etag_does_not_change(memo):
+    session = FakeSession(page('Ibali'), etag='"v1"')
+    extract = Extractions()
+    html = html_with(session, memo)
+    assert html.get_extracted(URL, extract) == ['Ibali']
+    # Even if the body served under the same ETag differs, the ETag is trusted
+    session.body = page('Ibali', 'Other')
+    assert html.get_extracted(URL, extract) == ['Ibali']
+    assert extract.count == 1
+
+
+def test_value_is_extracted_again_when_the_etag_changes(memo):
+    session = FakeSession(page('Ibali'), etag='"v1"')
+    extract = Extractions()
+    html = html_with(session, memo)
+    html.get_extracted(URL, extract)
+    session.body, session.etag = page('Ibali', 'New story'), '"v2"'
+    assert html.get_extracted(URL, extract) == ['Ibali', 'New story']
+    assert extract.count == 2
+    # The previous version is replaced
+    session.body, session.etag = page('Ibali'), '"v1"'
+    assert html.get_extracted(URL, extract) == ['Ibali']
+    assert extract.count == 3
+
+
+def test_pages_without_etag_are_validated_by_their_content(memo):
+    session = FakeSession(page('Ibali'))
+    extract = Extractions()
+    html = html_with(session, memo)
+    html.get_extracted(URL, extract)
+    html.get_extracted(URL, extract)
+    assert extract.count == 1
+    session.body = page('Ibali', 'New story')
+    assert html.get_extracted(URL, extract) == ['Ibali', 'New story']
+    assert extract.count == 2
+
+
+def test_values_are_kept_per_extraction_and_parser(memo):
+    memo.put(URL, 'story_titles.html.parser', '"v1"', ['Ibali'])
+    assert memo.get(URL, 'story_titles.html.parser', '"v1"') == (True, ['Ibali'])
+    assert memo.get(URL, 'story_titles.lxml', '"v1"') == (False, None)
+    assert memo.get(URL, 'story_titles.html.parser', '"v2"') == (False, None)
+
+
+def test_memo_persists_between_runs_until_invalidated(tmp_path, metrics):
+    path = str(tmp_path / 'parsememo.sqlite')
+    ParseMemo(path).put(URL, 'story_titles.html.parser', '"v1"', ['Ibali'])
+    memo = ParseMemo(path)
+    assert memo.get(URL, 'story_titles.html.parser', '"v1"') == (True, ['Ibali'])
+    memo.invalidate(URL)
+    assert memo.get(URL, 'story_titles.html.parser', '"v1"') == (False, None)
+    counters = metrics.snapshot()['counters']
+    assert (counters['parse_memo.hits'], counters['parse_memo.misses']) == (1, 1)
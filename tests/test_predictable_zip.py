@@ -0,0 +1,60 @@
+import os
+import random
+import zipfile
+
+from ricecooker.utils.zip import create_predictable_zip
+
+from nalibali_chef import PredictableZip
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_zip_is_byte_identical_to_create_predictable_zip(tmp_path):
+    rng = random.Random(0)
+    files = {
+        'index.html': b'<html><body><img src="sites/default/files/a.jpg"></body></html>',
+        os.path.join('sites', 'default', 'files', 'a.jpg'): rng.randbytes(20000),
+        os.path.join('sites', 'default', 'files', 'b.png'): b'\x89PNG' + bytes(5000),
+        # Larger than a chunk, so the entry is streamed in several writes
+        os.path.join('sites', 'default', 'files', 'big.jpg'): rng.randbytes(3 * 1024 * 1024),
+    }
+    story_dir = tmp_path / 'story'
+    story_zip = PredictableZip()
+    for arcname, data in files.items():
+        write(str(story_dir / arcname), data)
+        if arcname == 'index.html':
+            story_zip.add_bytes(arcname, data)
+        else:
+            # Images are added from a store outside of the story directory
+            stored_path = str(tmp_path / 'store' / os.path.basename(arcname))
+            write(stored_path, data)
+            story_zip.add_file(arcname, stored_path)
+
+    expected = create_predictable_zip(str(story_dir))
+    try:
+        assert read(story_zip.write(str(tmp_path / 'story.zip'))) == read(expected)
+    finally:
+        os.remove(expected)
+
+
+def test_last_file_in_document_order_is_kept(tmp_path):
+    first, second = str(tmp_path / 'first.jpg'), str(tmp_path / 'second.jpg')
+    write(first, b'first')
+    write(second, b'second')
+    arcname = os.path.join('images', 'story.jpg')
+    # Added in whichever order the image threads finish
+    for added in ([(first, 0), (second, 1)], [(second, 1), (first, 0)]):
+        story_zip = PredictableZip()
+        for path, position in added:
+            story_zip.add_file(arcname, path, position)
+        with zipfile.ZipFile(story_zip.write(str(tmp_path / 'story.zip'))) as written_zip:
+            assert written_zip.read(arcname) == b'second'
@@ -0,0 +1,158 @@
+import io
+import logging
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+import pytest
+import requests
+
+import nalibali_chef
+from nalibali_chef import Html, TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    """Stands in for the time module, where sleeping only moves the clock forward"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Rounding can leave a token a hair short, which real time always makes up for
+        self.now += max(seconds, 1e-9)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(nalibali_chef, 'time', types.SimpleNamespace(
+        monotonic=clock.monotonic, time=clock.time, sleep=clock.sleep, perf_counter=clock.monotonic))
+    return clock
+
+
+def test_bucket_sends_a_burst_then_spaces_requests(clock):
+    bucket = TokenBucket(5)
+    assert [bucket.acquire() for _ in range(5)] == [0] * 5
+    assert bucket.acquire() == pytest.approx(0.2)
+    assert bucket.acquire() == pytest.approx(0.2)
+
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket()
+    assert sum(bucket.acquire() for _ in range(1000)) == 0
+
+
+def test_throttled_bucket_halves_the_sent_rate(clock):
+    bucket = TokenBucket(10)
+    for _ in range(10):
+        bucket.acquire()
+    clock.sleep(1)
+    bucket.throttled()
+    # 10 requests sent in one second: the host gets 5 per second from now on
+    assert bucket.acquire() == pytest.approx(0.2)
+    assert bucket.acquire() == pytest.approx(0.2)
+
+
+def test_unlimited_bucket_is_limited_once_throttled(clock):
+    bucket = TokenBucket()
+    for _ in range(8):
+        bucket.acquire()
+    clock.sleep(2)
+    bucket.throttled()
+    # 8 requests sent in two seconds: the host gets 2 per second from now on
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_concurrent_throttles_count_once(clock):
+    bucket = TokenBucket(8)
+    for _ in range(8):
+        bucket.acquire()
+    clock.sleep(1)
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket._rate == 4
+
+
+def test_throttled_bucket_recovers_up_to_its_rate(clock):
+    bucket = TokenBucket(2)
+    for _ in range(2):
+        bucket.acquire()
+    clock.sleep(1)
+    bucket.throttled()
+    assert bucket._rate == TokenBucket.MIN_RATE * 2
+    steps = round((2 - 1) / TokenBucket.RATE_INCREASE) + 10
+    for _ in range(steps):
+        bucket.succeeded()
+    assert bucket._rate == 2
+    clock.sleep(1)
+    assert [bucket.acquire() for _ in range(2)] == [0, 0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_retry_after_pauses_every_request(clock):
+    bucket = TokenBucket()
+    bucket.throttled(retry_after=3)
+    assert bucket.acquire() == pytest.approx(3)
+    # The pause is over, but the throttled rate still applies
+    assert bucket.acquire() == pytest.approx(1 / TokenBucket.MIN_RATE)
+
+
+def response_with(headers):
+    response = requests.Response()
+    response.headers.update(headers)
+    return response
+
+
+def test_retry_after_seconds(clock):
+    assert retry_after_seconds(response_with({})) is None
+    assert retry_after_seconds(response_with({'Retry-After': ' 120 '})) == 120
+    assert retry_after_seconds(response_with({'Retry-After': formatdate(clock.now + 30, usegmt=True)})) == pytest.approx(30)
+    assert retry_after_seconds(response_with({'Retry-After': formatdate(clock.now - 30, usegmt=True)})) == 0
+    assert retry_after_seconds(response_with({'Retry-After': 'soon'})) is None
+
+
+class StreamingSession:
+    """Answers with streamed responses, and counts those that are open at the same time"""
+
+    def __init__(self):
+        self.open = 0
+        self.max_open = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.open += 1
+            self.max_open = max(self.max_open, self.open)
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(b'body')
+        close = response.close
+        def closed():
+            with self._lock:
+                self.open -= 1
+            close()
+        response.close = closed
+        return response
+
+
+def test_streamed_responses_hold_their_host_slot_until_closed():
+    session = StreamingSession()
+    html = Html(session, logging.getLogger(__name__), max_connections_per_host=2)
+
+    def download(url):
+        with html.get_image(url) as response:
+            threading.Event().wait(0.02)
+            return response.raw.read()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(download, [f'http://nalibali.org/{i}.jpg' for i in range(16)])) == [b'body'] * 16
+    assert session.max_open == 2
+    assert session.open == 0
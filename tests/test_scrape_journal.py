@@ -0,0 +1,121 @@
+import logging
+
+import pytest
+import requests
+
+import nalibali_chef
+from nalibali_chef import Html, Metrics, NalibaliChef, ScrapeJournal
+
+STORIES = [dict(url=f'http://nalibali.org/node/{i}', title=f'Story {i}', language='English') for i in range(5)]
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(nalibali_chef, 'METRICS', metrics)
+    return metrics
+
+
+@pytest.fixture
+def journal_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / 'scraping_journal.jsonl')
+
+
+class StoryScraper:
+    """Scrapes stories into nodes, failing the stories at the given URLs"""
+
+    def __init__(self, failing_urls=()):
+        self.__name__ = '_scrape_story_card'
+        self.failing_urls = set(failing_urls)
+        self.scraped = []
+
+    def __call__(self, story):
+        if story['url'] in self.failing_urls:
+            raise ValueError('no story section')
+        self.scraped.append(story['url'])
+        return dict(source_id=story['url'], title=story['title'], files=[dict(path=story['url'] + '.pdf')])
+
+
+def chef_with(journal):
+    logger = logging.getLogger(__name__)
+    chef = NalibaliChef(Html(requests.Session(), logger), logger)
+    chef._scrape_journal = journal
+    return chef
+
+
+def scrape(journal_path, scraper, resume, stories=STORIES):
+    chef = chef_with(ScrapeJournal(journal_path, resume=resume))
+    try:
+        return list(chef._scrape_map(scraper, stories)), chef._scrape_errors
+    finally:
+        chef._scrape_journal.close()
+
+
+def test_resumed_scrape_skips_journaled_stories(journal_path, metrics):
+    first_nodes, _ = scrape(journal_path, StoryScraper(), resume=False)
+    scraper = StoryScraper()
+    nodes, _ = scrape(journal_path, scraper, resume=True)
+    assert nodes == first_nodes
+    assert scraper.scraped == []
+    assert metrics.snapshot()['counters']['scrape.stories_resumed'] == len(STORIES)
+
+
+def test_scrape_without_resume_starts_over(journal_path):
+    scrape(journal_path, StoryScraper(), resume=False)
+    scraper = StoryScraper()
+    scrape(journal_path, scraper, resume=False)
+    assert len(scraper.scraped) == len(STORIES)
+
+
+def test_scrape_killed_midway_resumes_after_the_last_journaled_story(journal_path):
+    chef = chef_with(ScrapeJournal(journal_path))
+    nodes = chef._scrape_map(StoryScraper(), STORIES)
+    next(nodes)
+    next(nodes)
+    # Killed while writing the entry of the next story
+    chef._scrape_journal.close()
+    with open(journal_path, 'a') as journal_file:
+        journal_file.write('{"key": "half writ')
+    scraper = StoryScraper()
+    nodes, _ = scrape(journal_path, scraper, resume=True)
+    assert scraper.scraped == [story['url'] for story in STORIES[2:]]
+    assert [node['source_id'] for node in nodes] == [story['url'] for story in STORIES]
+
+
+def test_failing_stories_are_quarantined_and_retried(journal_path, metrics):
+    failing_url = STORIES[1]['url']
+    nodes, errors = scrape(journal_path, StoryScraper(failing_urls=[failing_url]), resume=False)
+    assert nodes[1] is None
+    assert [node['source_id'] for node in nodes if node] == [story['url'] for story in STORIES if story['url'] != failing_url]
+    assert [error['story'] for error in errors] == [STORIES[1]]
+    assert errors[0]['error'] == 'ValueError: no story section'
+    assert metrics.snapshot()['counters']['scrape.stories_failed'] == 1
+    # Failed stories are not journaled, so the next run scrapes them again
+    scraper = StoryScraper()
+    nodes, errors = scrape(journal_path, scraper, resume=True)
+    assert scraper.scraped == [failing_url]
+    assert errors == []
+    assert None not in nodes
+
+
+def test_changed_stories_are_scraped_again(journal_path):
+    scrape(journal_path, StoryScraper(), resume=False)
+    changed_stories = [dict(STORIES[0], title='Renamed')] + STORIES[1:]
+    scraper = StoryScraper()
+    scrape(journal_path, scraper, resume=True, stories=changed_stories)
+    assert scraper.scraped == [STORIES[0]['url']]
+
+
+def test_stories_whose_files_are_gone_are_scraped_again(journal_path, tmp_path):
+    zip_path = tmp_path / 'story.zip'
+    zip_path.write_bytes(b'zip')
+    journal = ScrapeJournal(journal_path)
+    journal.record(STORIES[0], dict(files=[dict(path=str(zip_path))]))
+    journal.record(STORIES[1], dict(files=[dict(path='http://nalibali.org/story.mp3')]))
+    journal.close()
+    zip_path.unlink()
+    journal = ScrapeJournal(journal_path, resume=True)
+    assert journal.get(STORIES[0]) is None
+    assert journal.get(STORIES[1]) is not None
+    journal.close()
@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+import requests
+
+import nalibali_chef
+from nalibali_chef import Html, Metrics, NalibaliChef, StoryIndex
+
+
+@pytest.fixture(autouse=True)
+def metrics(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(nalibali_chef, 'METRICS', metrics)
+    return metrics
+
+
+def identity(canonical=None, shortlink=None, content_hash=None):
+    return dict(canonical=canonical, shortlink=shortlink, content_hash=content_hash)
+
+
+def test_stories_sharing_any_identity_key_are_aliases():
+    index = StoryIndex()
+    assert index.add('http://nalibali.org/node/1', identity('http://nalibali.org/story-a', 'http://nalibali.org/node/1', 'a')) is None
+    assert index.add('http://nalibali.org/content/a', identity(canonical='http://nalibali.org/story-a')) == 'http://nalibali.org/node/1'
+    assert index.add('http://nalibali.org/node/2', identity(shortlink='http://nalibali.org/node/1')) == 'http://nalibali.org/node/1'
+    assert index.add('http://nalibali.org/node/3', identity(content_hash='a')) == 'http://nalibali.org/node/1'
+
+
+def test_stories_with_different_or_missing_keys_are_distinct():
+    index = StoryIndex()
+    assert index.add('http://nalibali.org/node/1', identity('http://nalibali.org/story-a', content_hash='a')) is None
+    assert index.add('http://nalibali.org/node/2', identity('http://nalibali.org/story-b', content_hash='b')) is None
+    # Pages without links nor story section share no key
+    assert index.add('http://nalibali.org/node/3', identity()) is None
+    assert index.add('http://nalibali.org/node/4', identity()) is None
+
+
+def test_aliases_of_an_alias_point_to_the_first_story():
+    index = StoryIndex()
+    index.add('http://nalibali.org/node/1', identity(canonical='http://nalibali.org/story-a'))
+    # Aliased through its canonical link, and brings in a new short link
+    index.add('http://nalibali.org/node/2', identity('http://nalibali.org/story-a', 'http://nalibali.org/node/2'))
+    assert index.add('http://nalibali.org/node/3', identity(shortlink='http://nalibali.org/node/2')) == 'http://nalibali.org/node/1'
+
+
+def test_same_url_added_again_is_an_alias_of_itself():
+    index = StoryIndex()
+    index.add('http://nalibali.org/node/1', identity(content_hash='a'))
+    assert index.add('http://nalibali.org/node/1', identity(content_hash='a')) == 'http://nalibali.org/node/1'
+
+
+def test_first_language_keeps_a_story_linked_from_several(monkeypatch):
+    logger = logging.getLogger(__name__)
+    chef = NalibaliChef(Html(requests.Session(), logger), logger)
+    identities = {
+        'http://nalibali.org/node/1': identity(canonical='http://nalibali.org/story-a'),
+        'http://nalibali.org/content/story-1': identity(canonical='http://nalibali.org/story-a'),
+        'http://nalibali.org/node/2': identity(canonical='http://nalibali.org/story-b'),
+    }
+    monkeypatch.setattr(chef, '_crawl_story_identity_at', identities.get)
+    stories_by_language = {
+        'English': [dict(url='http://nalibali.org/node/1'), dict(url='http://nalibali.org/node/2')],
+        'isiXhosa': [dict(url='http://nalibali.org/content/story-1')],
+        'Sesotho': [dict(url='http://nalibali.org/node/2')],
+    }
+    deduped = chef._crawl_drop_aliases(dict(title='Story seeds', url='http://nalibali.org/story-library/story-seeds'), stories_by_language)
+    assert deduped == {'English': stories_by_language['English']}
+    assert chef._story_aliases['Story seeds'] == [
+        dict(language='isiXhosa', url='http://nalibali.org/content/story-1', alias_of='http://nalibali.org/node/1'),
+        dict(language='Sesotho', url='http://nalibali.org/node/2', alias_of='http://nalibali.org/node/2'),
+    ]
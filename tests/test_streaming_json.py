@@ -0,0 +1,119 @@
+import io
+import json
+import os
+
+import pytest
+from ricecooker.utils.jsontrees import write_tree_to_json_tree
+
+from nalibali_chef import JsonStreamReader, StreamedDict, StreamedList, dump_json_stream, write_json_stream
+
+TREE = dict(
+    kind='NalibaliWebResourceTree',
+    title="Nal'ibali Web Resource Tree",
+    language='en',
+    children=[
+        dict(
+            kind='NalibaliHierarchy',
+            title='Multilingual stories',
+            children={
+                'isiXhosa': [dict(url='http://nalibali.org/node/1', title='Ibali "elide"', posted_date=None, page=12345678901234567890)],
+                'Sesotho': [],
+                'English': [dict(url='http://nalibali.org/node/2', title='Naïve ’story’ \\ end', ratio=-1.5e-07, audio=True)],
+            },
+        ),
+        dict(kind='NalibaliHierarchy', title='Story cards', children={}),
+    ],
+)
+
+
+def streamed(value):
+    """Returns value with every list and dict replaced by their streamed counterparts"""
+    if isinstance(value, dict):
+        return StreamedDict((key, streamed(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return StreamedList(streamed(item) for item in value)
+    return value
+
+
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_dump_json_stream_matches_json_dump(ensure_ascii):
+    for value in (TREE, streamed(TREE)):
+        json_file = io.StringIO()
+        dump_json_stream(value, json_file, ensure_ascii=ensure_ascii)
+        assert json_file.getvalue() == json.dumps(TREE, indent=2, ensure_ascii=ensure_ascii)
+
+
+def test_write_json_stream_matches_write_tree_to_json_tree(tmp_path):
+    expected_path = str(tmp_path / 'expected' / 'ricecooker_json_tree.json')
+    streamed_path = str(tmp_path / 'streamed' / 'ricecooker_json_tree.json')
+    write_tree_to_json_tree(expected_path, TREE)
+    write_json_stream(streamed_path, streamed(TREE), ensure_ascii=False, encoding='utf-8')
+    with open(expected_path, 'rb') as expected, open(streamed_path, 'rb') as written:
+        assert written.read() == expected.read()
+    assert os.stat(streamed_path).st_mode & 0o777 == os.stat(expected_path).st_mode & 0o777
+
+
+def test_write_json_stream_keeps_the_permissions_of_the_file_it_replaces(tmp_path):
+    path = str(tmp_path / 'web_resource_tree.json')
+    write_json_stream(path, TREE)
+    os.chmod(path, 0o640)
+    write_json_stream(path, TREE)
+    assert os.stat(path).st_mode & 0o777 == 0o640
+
+
+def test_failed_write_json_stream_leaves_the_previous_file(tmp_path):
+    path = str(tmp_path / 'web_resource_tree.json')
+    write_json_stream(path, TREE)
+
+    def failing_stories():
+        yield dict(title='first')
+        raise RuntimeError('scrape failed')
+
+    with pytest.raises(RuntimeError):
+        write_json_stream(path, StreamedDict([('children', StreamedList(failing_stories()))]))
+    assert os.listdir(str(tmp_path)) == ['web_resource_tree.json']
+    with open(path) as json_file:
+        assert json.load(json_file) == TREE
+
+
+def read_tree(reader):
+    """Reads TREE the way the scrape does, one hierarchy and one story at a time"""
+    tree = {}
+    for key in reader.iter_object():
+        if key != 'children':
+            tree[key] = reader.read_value()
+            continue
+        tree['children'] = []
+        for _ in reader.iter_array():
+            hierarchy = {}
+            for hierarchy_key in reader.iter_object():
+                if hierarchy_key != 'children':
+                    hierarchy[hierarchy_key] = reader.read_value()
+                    continue
+                hierarchy['children'] = {}
+                for language in reader.iter_object():
+                    hierarchy['children'][language] = [reader.read_value() for _ in reader.iter_array()]
+            tree['children'].append(hierarchy)
+    return tree
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, JsonStreamReader.CHUNK_SIZE])
+@pytest.mark.parametrize('indent', [2, None])
+def test_reader_handles_values_split_across_chunks(monkeypatch, chunk_size, indent):
+    # Every token, escape and number of the document is split at some chunk boundary
+    monkeypatch.setattr(JsonStreamReader, 'CHUNK_SIZE', chunk_size)
+    reader = JsonStreamReader(io.StringIO(json.dumps(TREE, indent=indent, ensure_ascii=False)))
+    assert read_tree(reader) == TREE
+
+
+def test_reader_reads_a_number_ending_the_document(monkeypatch):
+    monkeypatch.setattr(JsonStreamReader, 'CHUNK_SIZE', 2)
+    assert JsonStreamReader(io.StringIO('12345678')).read_value() == 12345678
+
+
+def test_reader_rejects_truncated_documents():
+    reader = JsonStreamReader(io.StringIO('{"children": [1, 2'))
+    with pytest.raises(ValueError):
+        for key in reader.iter_object():
+            for _ in reader.iter_array():
+                reader.read_value()